@@ -0,0 +1,257 @@
+"""
+Offline benchmarks for hot paths of the Duolingo client.
+
+Run all of them with ``python benchmarks.py``, or pass benchmark names to run a subset.
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+
+import requests
+
+import duolingo
+from stub_server import StubServer, random_words, synthetic_user_data
+
+
+def _offline_lingo(**kwargs):
+    """
+    Returns a Duolingo client which has not made any requests
+    """
+    return duolingo.Duolingo("benchmark", jwt="jwt-example", lazy=True, **kwargs)
+
+
+def _report(name, seconds, count, unit):
+    print("{:<40} {:>10.4f}s  {:>14,.0f} {}/s".format(name, seconds, count / seconds, unit))
+
+
+def _quadratic_segment_translations_list(words):
+    """The original segmentation algorithm, kept as a baseline."""
+    def is_word_list_valid(word_list):
+        return len(word_list) < 2000 and len(json.dumps(word_list)) < 12800
+    if is_word_list_valid(words):
+        return [words]
+    segments = []
+    segment = []
+    for word in words:
+        if not is_word_list_valid(segment + [word]):
+            segments.append(segment)
+            segment = []
+        segment.append(word)
+    segments.append(segment)
+    return segments
+
+
+def bench_segment_translations_list(word_count=100000, repeat=3):
+    words = random_words(word_count)
+    assert duolingo.Duolingo._segment_translations_list(words) == _quadratic_segment_translations_list(words)
+    linear = min(timeit.repeat(lambda: duolingo.Duolingo._segment_translations_list(words), number=1, repeat=repeat))
+    _report("segment_translations_list", linear, word_count, "words")
+    quadratic = min(timeit.repeat(lambda: _quadratic_segment_translations_list(words), number=1, repeat=1))
+    _report("segment_translations_list (baseline)", quadratic, word_count, "words")
+
+
+def _prepared_make_req(lingo, url):
+    """The original request path, which re-prepared every request and copied the cookie jar into it."""
+    headers = {'Authorization': 'Bearer ' + lingo.jwt, 'User-Agent': lingo.USER_AGENT}
+    req = requests.Request('GET', url, headers=headers, cookies=lingo.session.cookies)
+    return lingo.session.send(req.prepare())
+
+
+def bench_make_req(request_count=2000):
+    lingo = _offline_lingo()
+    # Give the jar a realistic number of cookies to copy
+    for i in range(20):
+        lingo.session.cookies.set("cookie{}".format(i), "x" * 40, domain="127.0.0.1")
+    with StubServer(require_auth=False) as server:
+        url = server.url("/2017-06-30/users?username=benchmark")
+        lingo._make_req(url)
+        seconds = timeit.timeit(lambda: lingo._make_req(url), number=request_count)
+        _report("make_req", seconds, request_count, "requests")
+        seconds = timeit.timeit(lambda: _prepared_make_req(lingo, url), number=request_count)
+        _report("make_req (baseline)", seconds, request_count, "requests")
+
+
+def _synthetic_skills(skill_count, seed=0):
+    """
+    Returns a reproducible skill tree, where each skill depends on up to three of the 50 skills before it
+    :param skill_count: int Number of skills to generate
+    :return: A list of skill dicts, as found in the legacy user document
+    """
+    rng = random.Random(seed)
+    skills = []
+    for i in range(skill_count):
+        candidates = ["skill{}".format(j) for j in range(max(0, i - 50), i)]
+        skills.append({
+            "name": "skill{}".format(i),
+            "learned": rng.random() < 0.8,
+            "dependencies_name": rng.sample(candidates, min(len(candidates), rng.randint(1, 3))),
+        })
+    rng.shuffle(skills)
+    return skills
+
+
+def _recursive_dependency_order(skills):
+    """The original recursive dependency ordering, kept as a baseline. It writes the order into the skills."""
+    def ordinal(skills_dict, skill, breadcrumbs):
+        if skill['name'] in breadcrumbs:
+            raise duolingo.DuolingoException("Loop encountered: {}".format(breadcrumbs + [skill['name']]))
+        if "dependency_order" in skill:
+            return skill["dependency_order"]
+        if not skill['dependencies_name']:
+            skill['dependency_order'] = 1
+            return 1
+        new_breadcrumbs = breadcrumbs + [skill['name']]
+        order = 1 + max([ordinal(skills_dict, skills_dict[name], new_breadcrumbs)
+                         for name in skill['dependencies_name']])
+        skill["dependency_order"] = order
+        return order
+    skills_dict = {skill['name']: skill for skill in skills}
+    for skill in skills:
+        skill['dependency_order'] = ordinal(skills_dict, skill, [])
+
+
+def bench_dependency_order(skill_count=5000, repeat=3):
+    skills = _synthetic_skills(skill_count)
+    order = duolingo.Duolingo._compute_dependency_order(skills)
+    seconds = min(timeit.repeat(lambda: duolingo.Duolingo._compute_dependency_order(skills), number=1, repeat=repeat))
+    _report("compute_dependency_order", seconds, skill_count, "skills")
+    # The recursive version needs one stack frame per level of the tree
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * max(order.values()) + 1000))
+    copies = [[dict(skill) for skill in skills] for _ in range(repeat)]
+    seconds = min(timeit.repeat(lambda: _recursive_dependency_order(copies.pop()), number=1, repeat=repeat))
+    _report("compute_dependency_order (baseline)", seconds, skill_count, "skills")
+    chain = [{"name": "skill{}".format(i), "dependencies_name": ["skill{}".format(i - 1)] if i else []}
+             for i in range(skill_count)]
+    seconds = min(timeit.repeat(lambda: duolingo.Duolingo._compute_dependency_order(chain), number=1, repeat=repeat))
+    _report("compute_dependency_order (chain)", seconds, skill_count, "skills")
+
+
+def bench_user_data_memory(account_count=50):
+    document = json.dumps(synthetic_user_data())
+    for name, load in [("User", duolingo.User.from_dict), ("Struct", lambda data: duolingo.Struct(**data))]:
+        tracemalloc.start()
+        accounts = [load(json.loads(document)) for _ in range(account_count)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del accounts
+        print("{:<40} {:>10.1f}MB  {:>14,.0f} bytes/account".format(
+            "user_data memory ({})".format(name), size / 1e6, size / account_count
+        ))
+
+
+def _stub_lingo(server, **kwargs):
+    """
+    Returns a Duolingo client logged in to a stub server
+    """
+    return duolingo.Duolingo(server.username, "password", adapters=server.adapters(pool_maxsize=16), **kwargs)
+
+
+def _report_latency(collector):
+    """Prints the latency percentiles of every endpoint seen by a HistogramCollector"""
+    for (endpoint, phase), stats in sorted(collector.summary().items()):
+        if phase == "total":
+            print("  {:<58} p50 {:>8.1f}ms  p95 {:>8.1f}ms  n={}".format(
+                endpoint.split("//", 1)[1], stats["p50"] * 1000, stats["p95"] * 1000, stats["count"]
+            ))
+
+
+def bench_login(latency=0.0, scale=1.0, client_count=20):
+    with StubServer(latency=latency, skill_count=int(100 * scale)) as server:
+        for name, create in [
+            ("login (password)", lambda: _stub_lingo(server)),
+            ("login (jwt)", lambda: duolingo.Duolingo(server.username, jwt=jwt, adapters=server.adapters())),
+        ]:
+            jwt = _stub_lingo(server).jwt
+            requests_before = server.requests
+            seconds = timeit.timeit(create, number=client_count)
+            _report(name, seconds, client_count, "clients")
+            print("  {:.1f} requests per client".format((server.requests - requests_before) / client_count))
+
+
+def bench_translations(latency=0.0, scale=1.0, word_count=10000):
+    words = random_words(int(word_count * scale))
+    with StubServer(latency=latency) as server:
+        for max_workers in [1, 8]:
+            collector = duolingo.HistogramCollector()
+            lingo = _stub_lingo(server, hooks=[collector])
+            seconds = timeit.timeit(lambda: lingo.get_translations(words, "en", "es", max_workers=max_workers),
+                                    number=1)
+            _report("get_translations (max_workers={})".format(max_workers), seconds, len(words), "words")
+            _report_latency(collector)
+
+
+def bench_audio_population(latency=0.0, scale=1.0, skill_count=100):
+    with StubServer(latency=latency, skill_count=int(skill_count * scale)) as server:
+        lingo = _stub_lingo(server)
+        lang = lingo.user_data.learning_language
+        for max_workers in [1, 8]:
+            seconds = timeit.timeit(lambda: lingo.populate_audio_urls(lang, max_workers=max_workers),
+                                    number=1)
+            _report("get_audio_url population (max_workers={})".format(max_workers), seconds,
+                    len(lingo.user_data.language_data[lang]["skills"]), "skills")
+
+
+def bench_leaderboard(latency=0.0, scale=1.0, friend_count=2000, repeat=20):
+    with StubServer(latency=latency, friend_count=int(friend_count * scale), language_count=1) as server:
+        collector = duolingo.HistogramCollector()
+        lingo = _stub_lingo(server, hooks=[collector])
+        for name, top in [("get_leaderboard", None), ("get_leaderboard (top=10)", 10)]:
+            seconds = timeit.timeit(lambda: lingo.get_leaderboard("week", "2020-01-01", top=top), number=repeat)
+            _report(name, seconds, repeat, "calls")
+        _report_latency(collector)
+
+
+def bench_learned_skills(latency=0.0, scale=1.0, skill_count=2000, repeat=5):
+    with StubServer(latency=latency, skill_count=int(skill_count * scale), language_count=1) as server:
+        lingo = _stub_lingo(server)
+        lang = lingo.user_data.learning_language
+
+        def cold():
+            # Assigning user_data drops the derived views, as reloading it would
+            lingo.user_data = lingo.user_data
+            return lingo.get_learned_skills(lang)
+        seconds = timeit.timeit(cold, number=repeat)
+        _report("get_learned_skills (cold)", seconds, repeat, "calls")
+        seconds = timeit.timeit(lambda: lingo.get_learned_skills(lang), number=repeat * 100)
+        _report("get_learned_skills (cached)", seconds, repeat * 100, "calls")
+
+
+BENCHMARKS = {
+    "segment": bench_segment_translations_list,
+    "make_req": bench_make_req,
+    "dependency_order": bench_dependency_order,
+    "user_data_memory": bench_user_data_memory,
+    "login": bench_login,
+    "translations": bench_translations,
+    "audio": bench_audio_population,
+    "leaderboard": bench_leaderboard,
+    "learned_skills": bench_learned_skills,
+}
+
+# Benchmarks against a stub server, which take the latency and scale options
+STUB_BENCHMARKS = {"login", "translations", "audio", "leaderboard", "learned_skills"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmarks", nargs="*", help="Benchmarks to run, out of: {}".format(", ".join(BENCHMARKS)))
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds the stub server waits before each response")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplier of the stub server's payload sizes and the number of words")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: {}".format(", ".join(sorted(unknown))))
+    for name in args.benchmarks or BENCHMARKS:
+        if name in STUB_BENCHMARKS:
+            BENCHMARKS[name](latency=args.latency, scale=args.scale)
+        else:
+            BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
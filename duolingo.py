@@ -1,11 +1,35 @@
 """Unofficial API for duolingo.com"""
+import os
 import re
+import sys
 import json
+import time
+import zlib
+import heapq
 import random
+import codecs
+import struct
+import hashlib
+import base64
+import asyncio
+import mmap
+import sqlite3
+import functools
+import threading
+import queue
+from types import MappingProxyType
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 from json import JSONDecodeError
 
 import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 __version__ = "0.5.4"
 __author__ = "Kartik Talwar"
@@ -18,6 +42,119 @@ class Struct:
         self.__dict__.update(entries)
 
 
+class Model(object):
+    """
+    Base of the compact models user_data is loaded into when a client is created with ``compact=True``.
+
+    Only the fields named in ``__slots__`` are kept, and strings are interned, so that repeated values such as language
+    codes, skill names and words are stored once per process. Fields can be read as attributes, or by key like the
+    dicts the models replace.
+    """
+    __slots__ = ()
+    # Fields holding nested models, as (container, model class). The container is list or dict for a list of models or
+    # a dict of keys to models, or None for a single model.
+    _nested = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls.__new__(cls)
+        for field in cls.__slots__:
+            if field not in data:
+                continue
+            value = data[field]
+            if field in cls._nested and value is not None:
+                container, nested_model = cls._nested[field]
+                if container is list:
+                    value = [nested_model.from_dict(item) for item in value]
+                elif container is dict:
+                    value = {sys.intern(key): nested_model.from_dict(item) for key, item in value.items()}
+                else:
+                    value = nested_model.from_dict(value)
+            else:
+                value = cls._intern(value)
+            setattr(model, field, value)
+        return model
+
+    @staticmethod
+    def _intern(value):
+        if isinstance(value, str):
+            return sys.intern(value)
+        if isinstance(value, list):
+            return tuple(Model._intern(item) for item in value)
+        return value
+
+    def keys(self):
+        return [field for field in self.__slots__ if hasattr(self, field)]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, field, None) == getattr(other, field, None) for field in self.__slots__
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(
+            "{}={!r}".format(field, self[field]) for field in self.keys()
+        ))
+
+
+class Skill(Model):
+    __slots__ = ('id', 'name', 'title', 'url_title', 'learned', 'strength', 'words', 'dependencies_name',
+                 'language_string', 'explanation', 'progress_percent')
+
+
+class CalendarEvent(Model):
+    __slots__ = ('skill_id', 'improvement', 'event_type', 'datetime')
+
+
+class FriendLanguage(Model):
+    __slots__ = ('language', 'language_string', 'points', 'level')
+
+
+class FriendPoints(Model):
+    __slots__ = ('total', 'languages')
+    _nested = {'languages': (list, FriendLanguage)}
+
+
+class Friend(Model):
+    __slots__ = ('id', 'username', 'avatar', 'points_data')
+    _nested = {'points_data': (None, FriendPoints)}
+
+
+class Language(Model):
+    __slots__ = ('language', 'language_string', 'streak', 'level', 'level_progress', 'level_percent', 'level_points',
+                 'level_left', 'next_level', 'num_skills_learned', 'points', 'points_rank', 'fluency_score',
+                 'calendar', 'skills', 'points_ranking_data')
+    _nested = {'calendar': (list, CalendarEvent), 'skills': (list, Skill), 'points_ranking_data': (list, Friend)}
+
+
+class LanguageSummary(Model):
+    __slots__ = ('language', 'language_string', 'learning', 'current_learning', 'level', 'points', 'streak')
+
+
+class User(Model):
+    __slots__ = ('id', 'username', 'fullname', 'bio', 'avatar', 'location', 'created', 'cohort', 'admin',
+                 'gplus_id', 'twitter_id', 'invites_left', 'contribution_points', 'num_followers', 'num_following',
+                 'learning_language', 'learning_language_string', 'ui_language', 'daily_goal', 'site_streak',
+                 'streak_extended_today', 'notify_comment', 'deactivated', 'is_follower_by', 'is_following',
+                 'calendar', 'languages', 'language_data')
+    _nested = {'calendar': (list, CalendarEvent), 'languages': (list, LanguageSummary),
+               'language_data': (dict, Language)}
+
+
 class DuolingoException(Exception):
     pass
 
@@ -42,66 +179,1329 @@ class OtherUserException(DuolingoException):
     pass
 
 
+class MemoryCacheBackend(object):
+    """Keeps cache entries in a dict, in least recently used order."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[key] = self._entries[key]
+        return found
+
+    def set_many(self, entries):
+        for key, entry in entries.items():
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def evict(self, max_size):
+        while len(self._entries) > max_size:
+            self._entries.popitem(last=False)
+
+
+class SQLiteCacheBackend(object):
+    """Keeps cache entries in a table of an SQLite database file, so they can be shared between runs and processes."""
+
+    def __init__(self, path, table="cache"):
+        if not re.match(r'^\w+$', table):
+            raise ValueError("Invalid table name: {}".format(table))
+        self.table = table
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value TEXT, stored_at REAL, used_at REAL)"
+            .format(table)
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS {0}_used_at ON {0} (used_at)".format(table))
+        self._last_used_at = 0
+
+    def _now(self):
+        # Strictly increasing, so entries touched in order are evicted in order even within one clock tick
+        self._last_used_at = max(time.time(), self._last_used_at + 1e-6)
+        return self._last_used_at
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        # Stay well under SQLite's limit on bound parameters
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._db.execute(
+                "SELECT key, value, stored_at FROM {} WHERE key IN ({})".format(self.table, placeholders), chunk
+            )
+            for key, value, stored_at in rows:
+                found[key] = (json.loads(value), stored_at)
+        if found:
+            self._db.executemany("UPDATE {} SET used_at = ? WHERE key = ?".format(self.table),
+                                 [(self._now(), key) for key in found])
+        return found
+
+    def set_many(self, entries):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO {} (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)".format(self.table),
+            [(key, json.dumps(value), stored_at, self._now()) for key, (value, stored_at) in entries.items()]
+        )
+
+    def delete_many(self, keys):
+        self._db.executemany("DELETE FROM {} WHERE key = ?".format(self.table), [(key,) for key in keys])
+
+    def evict(self, max_size):
+        self._db.execute(
+            "DELETE FROM {0} WHERE key IN (SELECT key FROM {0} ORDER BY used_at DESC LIMIT -1 OFFSET ?)"
+            .format(self.table),
+            (max_size,)
+        )
+
+    def close(self):
+        self._db.close()
+
+
+class Cache(object):
+    """
+    Least recently used cache with a size bound and an optional time to live.
+
+    Keys are tuples of strings and values must be JSON serialisable. Entries are stored in ``backend``, which defaults
+    to a :class:`MemoryCacheBackend`. ``hits`` and ``misses`` count lookups since the cache was created.
+    """
+
+    def __init__(self, backend=None, max_size=100000, ttl=None):
+        """
+        :param backend: Storage for the entries, such as :class:`MemoryCacheBackend` or :class:`SQLiteCacheBackend`.
+        :param max_size: Maximum number of entries kept. The least recently used ones are evicted first.
+        :param ttl: Number of seconds an entry is valid for, or None to keep entries until they are evicted.
+        """
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _backend_key(key):
+        return json.dumps(list(key), separators=(',', ':'))
+
+    def get_many(self, keys):
+        """Get a dict of key to value for the given keys which are cached and have not expired."""
+        backend_keys = {self._backend_key(key): key for key in keys}
+        with self._lock:
+            entries = self.backend.get_many(backend_keys)
+            oldest = None if self.ttl is None else time.time() - self.ttl
+            expired = [backend_key for backend_key, (_, stored_at) in entries.items()
+                       if oldest is not None and stored_at < oldest]
+            if expired:
+                self.backend.delete_many(expired)
+            found = {backend_keys[backend_key]: value for backend_key, (value, _) in entries.items()
+                     if backend_key not in expired}
+            self.hits += len(found)
+            self.misses += len(backend_keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        """Store a dict of key to value, evicting the least recently used entries beyond max_size."""
+        now = time.time()
+        with self._lock:
+            self.backend.set_many({self._backend_key(key): (value, now) for key, value in items.items()})
+            self.backend.evict(self.max_size)
+
+
+class SessionStore(object):
+    """
+    Login tokens of many accounts in one SQLite database file, which the threads and processes using it update
+    atomically.
+
+    Alongside each token the store keeps its expiry, and a lease which lets one client at a time renew an account's
+    token, while the others keep using the current one.
+    """
+
+    def __init__(self, path, table="sessions"):
+        """
+        :param path: File path to the SQLite database
+        :param table: Name of the table the tokens are kept in
+        """
+        if not re.match(r'^\w+$', table):
+            raise ValueError("Invalid table name: {}".format(table))
+        self.table = table
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (username TEXT PRIMARY KEY, jwt TEXT, expires_at REAL, updated_at REAL, "
+            "lease_until REAL)".format(table)
+        )
+
+    def get(self, username):
+        """Get the stored token of an account, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT jwt FROM {} WHERE username = ?".format(self.table), (username,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, username, jwt):
+        """Store the token of an account, and release its lease."""
+        expires_at = Duolingo._jwt_claims(jwt).get("exp")
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO {} (username, jwt, expires_at, updated_at, lease_until) "
+                "VALUES (?, ?, ?, ?, NULL)".format(self.table),
+                (username, jwt, expires_at, time.time())
+            )
+
+    def delete(self, username):
+        with self._lock:
+            self._db.execute("DELETE FROM {} WHERE username = ?".format(self.table), (username,))
+
+    def expiring(self, before):
+        """Get the accounts whose token expires before a timestamp."""
+        with self._lock:
+            rows = self._db.execute("SELECT username FROM {} WHERE expires_at < ?".format(self.table), (before,))
+            return [row[0] for row in rows]
+
+    def acquire_lease(self, username, duration=60):
+        """
+        Take the lease on renewing an account's token for ``duration`` seconds.
+
+        :return: True if the lease was taken, or False if another client holds it
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO {} (username) VALUES (?)".format(self.table), (username,))
+            cursor = self._db.execute(
+                "UPDATE {} SET lease_until = ? WHERE username = ? AND (lease_until IS NULL OR lease_until < ?)"
+                .format(self.table),
+                (now + duration, username, now)
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, username):
+        with self._lock:
+            self._db.execute("UPDATE {} SET lease_until = NULL WHERE username = ?".format(self.table), (username,))
+
+    def close(self):
+        self._db.close()
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting how many requests per second are made by the threads sharing it.
+
+    Up to ``burst`` requests can be made at once after a pause; beyond that, callers of :meth:`acquire` wait for their
+    turn. The rate adapts to the server: :meth:`throttle` halves it, down to ``min_rate``, and it then climbs back to
+    ``rate`` over ``recovery`` seconds.
+
+    Given a ``path``, the bucket is kept in an SQLite database file, so that every process using the same file and
+    ``name`` shares one budget.
+    """
+
+    def __init__(self, rate, burst=1, *, min_rate=None, recovery=60, path=None, name="requests"):
+        """
+        :param rate: Number of requests allowed per second
+        :param burst: Number of requests that can be made without waiting after the limiter has been idle
+        :param min_rate: Lowest rate :meth:`throttle` can lower the rate to. Defaults to a tenth of ``rate``.
+        :param recovery: Number of seconds the rate takes to climb back from ``min_rate`` to ``rate``
+        :param path: File path to an SQLite database to keep the bucket in, to share it between processes
+        :param name: Name of the bucket in the database, so one file can hold several
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.recovery = recovery
+        self.name = name
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS rate_limiter "
+                             "(name TEXT PRIMARY KEY, tokens REAL, rate REAL, updated REAL)")
+        self._tokens = burst
+        self._current_rate = rate
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """Wait until a request may be made."""
+        # Taking the token before sleeping reserves this caller's turn, so waiting callers are served in order
+        wait = self._update(lambda tokens, rate: (tokens - 1, rate))
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttle(self, delay=0):
+        """
+        Halve the request rate, and hold back every caller for ``delay`` seconds, after the server signalled that
+        requests are coming too fast.
+        """
+        def throttled(tokens, rate):
+            rate = max(self.min_rate, rate / 2)
+            return min(tokens, 0) - delay * rate, rate
+        self._update(throttled)
+
+    def _update(self, take):
+        """
+        Refill the bucket, apply ``take(tokens, rate) -> (tokens, rate)`` to it, and return the number of seconds until
+        the bucket is no longer in debt.
+        """
+        with self._lock:
+            if self._db is None:
+                now = time.monotonic()
+                self._tokens, self._current_rate = self._refill(self._tokens, self._current_rate, self._updated, now)
+                self._tokens, self._current_rate = take(self._tokens, self._current_rate)
+                self._updated = now
+                return -self._tokens / self._current_rate
+            # Processes don't share a monotonic clock, so the shared bucket runs on wall time
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tokens, rate, updated FROM rate_limiter WHERE name = ?",
+                                       (self.name,)).fetchone()
+                tokens, rate = self._refill(*row, now) if row else (self.burst, self.rate)
+                tokens, rate = take(tokens, rate)
+                self._db.execute("INSERT OR REPLACE INTO rate_limiter (name, tokens, rate, updated) "
+                                 "VALUES (?, ?, ?, ?)", (self.name, tokens, rate, now))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return -tokens / rate
+
+    def _refill(self, tokens, rate, updated, now):
+        elapsed = max(0, now - updated)
+        rate = min(self.rate, rate + (self.rate - self.min_rate) * elapsed / self.recovery)
+        return min(self.burst, tokens + elapsed * rate), rate
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+class Backoff(object):
+    """
+    Policy for retrying requests which failed with a throttling or server error status.
+
+    Retries wait for the server's ``Retry-After`` header when it has one, and otherwise for a random time of up to
+    ``base * 2 ** attempt`` seconds, so clients which failed together don't retry together.
+
+    Only GET requests are retried unless other methods are listed, since a POST such as buying an item may have taken
+    effect even though the server answered with an error.
+    """
+
+    def __init__(self, retries=3, base=1, cap=60, statuses=(429, 500, 502, 503, 504), methods=("GET",)):
+        """
+        :param retries: Number of times a request is retried
+        :param base: Longest wait before the first retry, in seconds. It doubles with every further retry.
+        :param cap: Longest wait before any retry, in seconds
+        :param statuses: HTTP statuses which are retried
+        :param methods: HTTP methods which are retried
+        """
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+
+    def retries_request(self, method, status, attempt):
+        """
+        Whether a request which failed with ``status`` after ``attempt`` retries is retried.
+        """
+        return method in self.methods and status in self.statuses and attempt < self.retries
+
+    def delay(self, attempt, resp=None):
+        """
+        Get the number of seconds to wait before retrying.
+
+        :param attempt: Number of retries made so far
+        :param resp: The failed response, whose ``Retry-After`` header is used if present
+        """
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+        if retry_after:
+            try:
+                return min(self.cap, max(0, float(retry_after)))
+            except ValueError:
+                pass
+            try:
+                return min(self.cap, max(0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class _JSONArrayStream(object):
+    """
+    Reads a JSON document incrementally, and yields the items of the arrays found at a path one at a time.
+
+    Only the item being decoded and the unread part of the current chunk are held in memory, however large the document
+    is. The path is a tuple of object keys leading to the arrays, where None matches any key; for example
+    ``('language_data', None, 'skills')``.
+    """
+    _STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+    _SCALAR_END = re.compile(r'[\s,:\]\}]')
+
+    def __init__(self, chunks, path):
+        """
+        :param chunks: Iterable of bytes making up a UTF-8 JSON document, such as ``response.iter_content()``
+        :param path: Tuple of keys leading to the arrays to yield the items of
+        """
+        self._chunks = iter(chunks)
+        self._path = tuple(path)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        # One [is_object, last_key] entry per open object or array
+        self._stack = []
+        self._expect_key = False
+
+    def _fill(self):
+        """Read the next chunk into the buffer, dropping the text already consumed. Returns False at the end."""
+        if self._eof:
+            return False
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            self._buffer += self._text_decoder.decode(b"", final=True)
+        else:
+            self._buffer += self._text_decoder.decode(chunk)
+        return True
+
+    def _at_path(self):
+        if len(self._stack) != len(self._path):
+            return False
+        return all(is_object and (expected is None or key == expected)
+                   for (is_object, key), expected in zip(self._stack, self._path))
+
+    def __iter__(self):
+        while True:
+            if self._pos >= len(self._buffer):
+                if not self._fill():
+                    return
+                continue
+            char = self._buffer[self._pos]
+            if char in " \t\r\n:":
+                self._pos += 1
+            elif char == ",":
+                self._pos += 1
+                self._expect_key = bool(self._stack) and self._stack[-1][0]
+            elif char == "{":
+                self._pos += 1
+                self._stack.append([True, None])
+                self._expect_key = True
+            elif char == "[":
+                self._pos += 1
+                if self._at_path():
+                    for item in self._array_items():
+                        yield item
+                else:
+                    self._stack.append([False, None])
+            elif char in "}]":
+                self._pos += 1
+                self._stack.pop()
+                self._expect_key = False
+            elif char == '"':
+                match = self._STRING_BODY.match(self._buffer, self._pos + 1)
+                if match is None:
+                    if not self._fill():
+                        raise ValueError("Unterminated string in JSON document")
+                    continue
+                if self._expect_key:
+                    self._stack[-1][1] = json.loads(self._buffer[self._pos:match.end()])
+                    self._expect_key = False
+                self._pos = match.end()
+            else:
+                match = self._SCALAR_END.search(self._buffer, self._pos)
+                if match is None and not self._eof:
+                    self._fill()
+                    continue
+                self._pos = match.start() if match else len(self._buffer)
+
+    def _array_items(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n,":
+                self._pos += 1
+            if self._pos >= len(self._buffer):
+                if not self._fill():
+                    raise ValueError("Unterminated array in JSON document")
+                continue
+            if self._buffer[self._pos] == "]":
+                self._pos += 1
+                return
+            try:
+                item, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # An item is only complete once a delimiter follows it, since a number split across chunks such as "1." and
+            # "5" decodes as 1
+            if (end == len(self._buffer) or self._buffer[end] not in " \t\r\n,]") and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            yield item
+
+
+DUOLINGO_HOSTS = ("https://www.duolingo.com", "https://duolingo.com", "https://d2.duolingo.com")
+
+# Connection timings of the request being sent by the current thread, filled in by the timed connections below
+_request_timings = threading.local()
+
+
+class _TimedConnectionMixin(object):
+    """Records how long opening the connection (DNS lookup and TCP connect) and the TLS handshake take."""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._connect_time = time.perf_counter() - start
+
+    def connect(self):
+        self._connect_time = 0
+        start = time.perf_counter()
+        super().connect()
+        timings = getattr(_request_timings, "current", None)
+        if timings is not None:
+            timings["connect"] = self._connect_time
+            timings["tls"] = time.perf_counter() - start - self._connect_time
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report their connect and TLS handshake times to :class:`RequestEvent`."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+
+def make_adapters(pool_maxsize=10, max_retries=0, host_options=None):
+    """
+    Build connection pooling adapters for the Duolingo hosts, to pass as ``adapters`` to :class:`Duolingo`.
+
+    Passing the same adapters to many clients makes them share one bounded set of warm connections per host, while each
+    client keeps its own session, cookies and login.
+
+    :param pool_maxsize: Maximum number of connections kept open to each host.
+    :param max_retries: Number of retries, or a ``urllib3.util.Retry`` policy, for failed connections and requests.
+    :param host_options: Dict of host URL prefix (one of ``DUOLINGO_HOSTS``) to a dict overriding ``pool_maxsize`` or
+    ``max_retries`` for that host.
+    :return: Dict of host URL prefix to ``requests.adapters.HTTPAdapter``
+    """
+    adapters = {}
+    for host in DUOLINGO_HOSTS:
+        options = {"pool_maxsize": pool_maxsize, "max_retries": max_retries}
+        options.update((host_options or {}).get(host, {}))
+        adapters[host] = _TimedHTTPAdapter(pool_connections=1, **options)
+    return adapters
+
+
+_ENDPOINT_PATTERNS = (
+    (re.compile(r'/users/[^/]+'), '/users/{user}'),
+    (re.compile(r'/dictionary/hints/[^/]+/[^/]+'), '/dictionary/hints/{source}/{target}'),
+    (re.compile(r'/[0-9a-f]{16,}(?=/|$)'), '/{id}'),
+)
+
+
+def _endpoint_template(url):
+    """Get a URL without its query, and with user names, IDs and languages in its path replaced by placeholders."""
+    origin, _, path = url.split("?", 1)[0].partition("//")[2].partition("/")
+    path = "/" + path
+    for pattern, placeholder in _ENDPOINT_PATTERNS:
+        path = pattern.sub(placeholder, path)
+    return url.split("//", 1)[0] + "//" + origin + path
+
+
+class RequestEvent(object):
+    """
+    Measurements of one HTTP request, passed to the ``on_request`` method of each of a client's hooks.
+
+    ``timings`` is a dict of seconds spent in each phase: ``connect`` (DNS lookup and TCP connect) and ``tls`` when a
+    new connection was opened by the adapters from :func:`make_adapters`, ``wait`` until the response headers arrived,
+    ``download`` of the body, ``decode`` of the JSON body, and ``total`` for the whole request.
+    """
+    __slots__ = ('method', 'url', 'endpoint', 'status', 'request_bytes', 'response_bytes', 'attempt', 'error',
+                 'started_at', 'timings')
+
+    def __init__(self, method, url, endpoint, status=None, request_bytes=0, response_bytes=None, attempt=0,
+                 error=None, started_at=None, timings=None):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        self.status = status
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.attempt = attempt
+        self.error = error
+        self.started_at = started_at
+        self.timings = timings if timings is not None else {}
+
+    def __repr__(self):
+        return "RequestEvent({} {} -> {})".format(self.method, self.endpoint, self.status)
+
+
+class HistogramCollector(object):
+    """
+    Hook keeping histograms of request timings in memory, per endpoint template and phase, along with counts of
+    responses per status and the number of bytes received.
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        :param buckets: Increasing upper bounds of the histogram buckets, in seconds. Longer timings are counted in an
+        extra bucket.
+        """
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.statuses = {}
+        self.response_bytes = {}
+        self._lock = threading.Lock()
+
+    def on_request(self, event):
+        with self._lock:
+            status_key = (event.endpoint, event.status)
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+            if event.response_bytes:
+                self.response_bytes[event.endpoint] = self.response_bytes.get(event.endpoint, 0) + event.response_bytes
+            for phase, seconds in event.timings.items():
+                histogram = self.histograms.get((event.endpoint, phase))
+                if histogram is None:
+                    histogram = self.histograms[(event.endpoint, phase)] = {
+                        "counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0, "max": 0.0
+                    }
+                histogram["counts"][self._bucket_index(seconds)] += 1
+                histogram["count"] += 1
+                histogram["sum"] += seconds
+                histogram["max"] = max(histogram["max"], seconds)
+
+    def _bucket_index(self, seconds):
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                return index
+        return len(self.buckets)
+
+    def quantile(self, endpoint, phase, q):
+        """
+        Estimate a quantile of the timings of a phase, interpolating within the bucket it falls in. Estimates never
+        exceed the longest timing recorded.
+
+        :param endpoint: Endpoint template, as in :attr:`RequestEvent.endpoint`
+        :param phase: Name of the phase, such as ``'total'``
+        :param q: Quantile between 0 and 1, such as 0.99
+        :return: The estimate in seconds, or None if nothing was recorded
+        """
+        with self._lock:
+            histogram = self.histograms.get((endpoint, phase))
+            if histogram is None or not histogram["count"]:
+                return None
+            rank = q * histogram["count"]
+            seen = 0
+            for index, count in enumerate(histogram["counts"]):
+                if count and seen + count >= rank:
+                    if index == len(self.buckets):
+                        return histogram["max"]
+                    lower = self.buckets[index - 1] if index else 0
+                    return min(histogram["max"], lower + (self.buckets[index] - lower) * (rank - seen) / count)
+                seen += count
+            return histogram["max"]
+
+    def summary(self):
+        """Get a dict of ``(endpoint, phase)`` to the count, mean, p50, p95, p99 and max of its timings."""
+        return {
+            key: {
+                "count": histogram["count"],
+                "mean": histogram["sum"] / histogram["count"],
+                "max": histogram["max"],
+                "p50": self.quantile(key[0], key[1], 0.5),
+                "p95": self.quantile(key[0], key[1], 0.95),
+                "p99": self.quantile(key[0], key[1], 0.99),
+            }
+            for key, histogram in list(self.histograms.items())
+        }
+
+
+class OTLPExporter(object):
+    """
+    Hook exporting every request as an OpenTelemetry client span to a collector, with the OTLP/HTTP JSON protocol.
+
+    Spans are sent in batches of ``batch_size`` by a background thread, so requests never wait for the collector; call
+    :meth:`flush` to send the rest and wait for them, for example before exiting. Batches which can't be delivered, or
+    which arrive while ``max_pending`` batches are already waiting, are dropped and counted in ``dropped``, so a
+    missing or slow collector never breaks or slows down requests.
+    """
+
+    def __init__(self, endpoint="http://localhost:4318/v1/traces", service_name="duolingo", batch_size=100,
+                 timeout=5, max_pending=10):
+        """
+        :param endpoint: URL of the collector's OTLP/HTTP traces endpoint
+        :param service_name: ``service.name`` resource attribute of the spans
+        :param batch_size: Number of spans sent together
+        :param timeout: Number of seconds to wait for the collector
+        :param max_pending: Number of batches waiting to be sent before more are dropped
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.dropped = 0
+        self._spans = []
+        self._lock = threading.Lock()
+        self._batches = queue.Queue(max_pending)
+        self._worker = None
+        # A session of its own, so exporting doesn't go through the hooks and rate limits of a client
+        self._session = requests.Session()
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def on_request(self, event):
+        start = int(event.started_at * 1e9)
+        attributes = [self._attribute("http.request.method", event.method),
+                      self._attribute("url.full", event.url),
+                      self._attribute("url.template", event.endpoint),
+                      self._attribute("http.request.body.size", event.request_bytes),
+                      self._attribute("http.request.resend_count", event.attempt)]
+        if event.status is not None:
+            attributes.append(self._attribute("http.response.status_code", event.status))
+        if event.response_bytes is not None:
+            attributes.append(self._attribute("http.response.body.size", event.response_bytes))
+        if event.error is not None:
+            attributes.append(self._attribute("error.type", type(event.error).__name__))
+        attributes += [self._attribute("duolingo.timing.{}".format(phase), seconds)
+                       for phase, seconds in sorted(event.timings.items())]
+        span = {
+            "traceId": "{:032x}".format(random.getrandbits(128)),
+            "spanId": "{:016x}".format(random.getrandbits(64)),
+            "name": "{} {}".format(event.method, event.endpoint),
+            "kind": 3,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int(event.timings.get("total", 0) * 1e9)),
+            "attributes": attributes,
+            "status": {"code": 2 if event.error is not None or (event.status or 0) >= 500 else 0},
+        }
+        with self._lock:
+            self._spans.append(span)
+            if len(self._spans) < self.batch_size:
+                return
+            spans, self._spans = self._spans, []
+        self._submit(spans)
+
+    def flush(self):
+        """Send the spans which have not been sent yet, and wait until they are."""
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if spans:
+            self._submit(spans)
+        self._batches.join()
+
+    def close(self):
+        """Send the remaining spans and stop the background thread."""
+        self.flush()
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._batches.put(None)
+            worker.join()
+
+    def _submit(self, spans):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="duolingo-otlp-exporter", daemon=True)
+                self._worker.start()
+        try:
+            self._batches.put_nowait(spans)
+        except queue.Full:
+            with self._lock:
+                self.dropped += len(spans)
+
+    def _run(self):
+        while True:
+            spans = self._batches.get()
+            try:
+                if spans is None:
+                    return
+                self._export(spans)
+            finally:
+                self._batches.task_done()
+
+    def _export(self, spans):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "duolingo"}, "spans": spans}],
+        }]}
+        try:
+            self._session.post(self.endpoint, json=body, timeout=self.timeout).raise_for_status()
+        except requests.RequestException:
+            with self._lock:
+                self.dropped += len(spans)
+
+
+class Cassette(object):
+    """
+    HTTP responses recorded in an append-only file, to replay a client's requests without any network access.
+
+    Each record is a header of the SHA-1 key of the request (its method, URL and body) and the length of the zlib
+    compressed response that follows. Opening a cassette only reads the headers to build an index of key to record
+    offsets; responses are read from disk when they are replayed. Requests recorded more than once are replayed in the
+    order they were recorded, repeating the last response once they run out.
+
+    The mode is one of ``'replay'``, which only serves recorded responses, ``'record'``, which sends every request and
+    records its response, or ``'fill'``, which replays recorded responses and records the missing ones. Recorded
+    responses include their headers, such as the ``jwt`` header of a login, so cassettes should be kept private.
+    """
+    MAGIC = b"DUOLINGO-CASSETTE-1\n"
+    MODES = ("replay", "record", "fill")
+    _HEADER = struct.Struct(">20sI")
+
+    def __init__(self, path, mode="replay"):
+        """
+        :param path: File path of the cassette. It is created when recording.
+        :param mode: One of ``MODES``
+        """
+        if mode not in self.MODES:
+            raise ValueError("Invalid cassette mode: {}".format(mode))
+        self.path = path
+        self.mode = mode
+        self._index = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self._file = open(path, "rb")
+        else:
+            self._file = open(path, "a+b")
+        self._load_index()
+
+    def _load_index(self):
+        self._file.seek(0)
+        magic = self._file.read(len(self.MAGIC))
+        if not magic and self.mode != "replay":
+            self._file.write(self.MAGIC)
+            self._file.flush()
+            self._end = len(self.MAGIC)
+            return
+        if magic != self.MAGIC:
+            raise DuolingoException("Not a cassette file: {}".format(self.path))
+        size = os.fstat(self._file.fileno()).st_size
+        offset = len(self.MAGIC)
+        if size > offset:
+            unpack_from, header_size, index = self._HEADER.unpack_from, self._HEADER.size, self._index
+            with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                while offset + header_size <= size:
+                    key, length = unpack_from(data, offset)
+                    start = offset + header_size
+                    if start + length > size:
+                        break
+                    if key in index:
+                        index[key].append((start, length))
+                    else:
+                        index[key] = [(start, length)]
+                    offset = start + length
+        # Drop a record cut short by a crash while it was written, so new records follow the last complete one
+        if self.mode != "replay":
+            self._file.truncate(offset)
+        self._end = offset
+
+    def __len__(self):
+        return sum(len(records) for records in self._index.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def key(method, url, body=None):
+        """Get the key a request is recorded under."""
+        digest = hashlib.sha1("{} {}\n".format(method, url).encode())
+        if body:
+            digest.update(body if isinstance(body, bytes) else body.encode())
+        return digest.digest()
+
+    def find(self, key):
+        """
+        Get the next recorded response of a request, as a tuple of a dict of its status, reason and headers, and its
+        body, or None if the request wasn't recorded.
+        """
+        with self._lock:
+            records = self._index.get(key)
+            if not records:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            offset, length = records[min(position, len(records) - 1)]
+            self._file.seek(offset)
+            data = zlib.decompress(self._file.read(length))
+        meta_length, = struct.unpack(">I", data[:4])
+        return json.loads(data[4:4 + meta_length].decode()), data[4 + meta_length:]
+
+    def record(self, key, meta, body):
+        """Append a response to the cassette."""
+        meta = json.dumps(meta, separators=(',', ':')).encode()
+        data = zlib.compress(struct.pack(">I", len(meta)) + meta + body)
+        with self._lock:
+            self._file.seek(self._end)
+            self._file.write(self._HEADER.pack(key, len(data)) + data)
+            self._file.flush()
+            offset = self._end + self._HEADER.size
+            self._end = offset + len(data)
+            self._index.setdefault(key, []).append((offset, len(data)))
+            # Recording a request again shouldn't change what the requests replayed so far will see next
+            self._positions[key] = len(self._index[key])
+
+    def close(self):
+        self._file.close()
+
+
+class CassetteAdapter(BaseAdapter):
+    """
+    Transport adapter serving responses from a :class:`Cassette`, and recording the responses of another adapter in
+    it when the cassette's mode allows.
+    """
+
+    def __init__(self, cassette, adapter=None):
+        """
+        :param cassette: The :class:`Cassette` to replay and record
+        :param adapter: Adapter sending the requests which are recorded. Defaults to a ``requests`` HTTPAdapter.
+        """
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter if adapter is not None else HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        key = self.cassette.key(request.method, request.url, request.body)
+        if self.cassette.mode != "record":
+            found = self.cassette.find(key)
+            if found is not None:
+                return self._build_response(request, *found)
+            if self.cassette.mode == "replay":
+                raise DuolingoException("No recorded response for {} {}".format(request.method, request.url))
+        resp = self.adapter.send(request, **kwargs)
+        self.cassette.record(key, {"status": resp.status_code, "reason": resp.reason, "headers": dict(resp.headers)},
+                             resp.content)
+        return resp
+
+    @staticmethod
+    def _build_response(request, meta, body):
+        resp = requests.Response()
+        resp.status_code = meta["status"]
+        resp.reason = meta["reason"]
+        resp.headers = CaseInsensitiveDict(meta["headers"])
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.url = request.url
+        resp.request = request
+        resp._content = body
+        resp._content_consumed = True
+        return resp
+
+    def close(self):
+        self.adapter.close()
+
+
 class Duolingo(object):
     USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.116 " \
                  "Safari/537.36"
 
-    def __init__(self, username, password=None, *, jwt=None, session_file=None):
+    VOICE_CACHE_TTL = 7 * 24 * 60 * 60
+
+    # Number of seconds before its expiry that a token stops being trusted without checking it
+    JWT_EXPIRY_MARGIN = 60
+
+    # Number of responses remembered for conditional requests, least recently used first out
+    CONDITIONAL_CACHE_SIZE = 32
+
+    def __init__(self, username, password=None, *, jwt=None, session_file=None, max_workers=1,
+                 voice_cache_file=None, voice_cache_ttl=VOICE_CACHE_TTL, translation_cache=None, definition_cache=None,
+                 projection=False, lazy=False, conditional_requests=False, adapters=None, keep_alive=True,
+                 compact=False, rate_limiter=None, backoff=None, hooks=None, cassette=None, session_store=None):
         """
         :param username: Username to use for duolingo
         :param password: Password to authenticate as user.
-        :param jwt: Duolingo login token. Will be checked and used if it is valid.
+        :param jwt: Duolingo login token. Will be checked and used if it is valid. A token which carries its expiry is
+        trusted until shortly before then without a request to check it.
         :param session_file: File path to a file that the session token can be stored in, to save repeated login
         requests.
+        :param max_workers: Default number of requests kept in flight by methods which fetch many resources at once.
+        :param voice_cache_file: File path to a file that scraped audio URLs can be stored in, so that get_audio_url
+        only has to scrape skills which are new or older than voice_cache_ttl.
+        :param voice_cache_ttl: Number of seconds a skill's cached audio URLs are reused for.
+        :param translation_cache: :class:`Cache` that get_translations stores translations in, keyed by source
+        language, target language and word. Can be shared between clients.
+        :param definition_cache: :class:`Cache` that get_word_definitions stores dictionary entries in, keyed by lexeme
+        ID. Can be shared between clients.
+        :param projection: Fetch only the fields a getter needs from ``https://www.duolingo.com/2017-06-30/users``
+        where possible, and only download the full ``https://www.duolingo.com/users/<username>`` document into
+        user_data when it is first accessed.
+        :param lazy: Don't make any requests when the client is created. Logging in is deferred to the first request,
+        or skipped entirely when a jwt is given, which is then trusted to be valid. user_data is downloaded on its first
+        access.
+        :param conditional_requests: Remember the ETag and Last-Modified validators of GET responses, and send them
+        with later requests to the same URL. A 304 Not Modified reply reuses the remembered response and its decoded
+        JSON. The ``CONDITIONAL_CACHE_SIZE`` most recently used URLs are remembered.
+        :param adapters: Dict of URL prefix to ``requests`` transport adapter to mount on the session, such as the
+        connection pools built by :func:`make_adapters`. The same adapters can be shared by many clients.
+        :param keep_alive: Keep connections open between requests. If False, every request asks the server to close its
+        connection.
+        :param compact: Load user_data into a :class:`User` model, which keeps only the fields this library uses and
+        interns repeated strings, instead of a :class:`Struct` of the whole document.
+        :param rate_limiter: :class:`RateLimiter` that every request waits on. Share one between clients, or between
+        processes through its ``path``, to keep their combined request rate below what triggers captchas. It is
+        throttled when a response is 429 Too Many Requests, a server error or a captcha.
+        :param backoff: :class:`Backoff` policy for retrying requests which failed with a throttling or server error
+        status. Requests aren't retried by default.
+        :param hooks: List of objects whose ``on_request(event)`` method is called with a :class:`RequestEvent` after
+        every HTTP request, such as :class:`HistogramCollector` or :class:`OTLPExporter`. Unless ``adapters`` are given,
+        the session then uses the adapters from :func:`make_adapters`, which also time connecting to the server.
+        :param cassette: :class:`Cassette` that every response is replayed from or recorded to, depending on its mode.
+        In ``'replay'`` mode, no request reaches the network.
+        :param session_store: :class:`SessionStore` to keep the session token in instead of ``session_file``, so that
+        many accounts and processes can share one file.
         """
         self.username = username
         self._original_username = username
         self.password = password
         self.session_file = session_file
+        self.session_store = session_store
+        self.max_workers = max_workers
+        self.voice_cache_file = voice_cache_file
+        self.voice_cache_ttl = voice_cache_ttl
+        self.translation_cache = translation_cache
+        self.definition_cache = definition_cache
+        self.projection = projection
+        self.compact = compact
+        self._user_data = None
+        self._user_ids = {}
+        self._views = {}
         self.session = requests.Session()
+        self._environment_settings_by_origin = {}
+        self.hooks = list(hooks or [])
+        if self.hooks and adapters is None:
+            adapters = make_adapters()
+        for prefix, adapter in (adapters or {}).items():
+            self.session.mount(prefix, adapter)
+        if cassette is not None:
+            for prefix, adapter in list(self.session.adapters.items()):
+                self.session.mount(prefix, CassetteAdapter(cassette, adapter))
+        self.session.headers['User-Agent'] = self.USER_AGENT
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
         self.leader_data = None
         self.jwt = jwt
-
-        if password or jwt or session_file:
+        self.lazy = lazy
+        self._login_pending = False
+        self._login_lock = threading.RLock()
+        self._logging_in = False
+        self.conditional_requests = conditional_requests
+        self.rate_limiter = rate_limiter
+        self.backoff = backoff
+        self._conditional_responses = OrderedDict()
+        self._conditional_payloads = {}
+        self._conditional_lock = threading.Lock()
+        self._login_check = None
+
+        if not (password or jwt or session_file or session_store):
+            raise DuolingoException("Password, jwt, session_file or session_store must be specified in order to "
+                                    "authenticate.")
+        if not lazy:
             self._login()
+        elif jwt is None:
+            self._login_pending = True
+
+        # In projection mode, the user document downloaded to check the login is kept as user_data, rather than
+        # fetching projections of it later
+        if not lazy and (not projection or self._login_check is not None):
+            self._load_user_data()
+        # Only the user_data load above may reuse the login check response; later requests must not get it
+        self._login_check = None
+        self.voice_url_dict = None
+
+    @property
+    def jwt(self):
+        return self._jwt
+
+    @jwt.setter
+    def jwt(self, jwt):
+        # Kept on the session, so every request made through it is authenticated
+        self._jwt = jwt
+        if jwt is None:
+            self.session.headers.pop('Authorization', None)
         else:
-            raise DuolingoException("Password, jwt, or session_file must be specified in order to authenticate.")
+            self.session.headers['Authorization'] = 'Bearer ' + jwt
 
-        self.user_data = Struct(**self._get_data())
-        self.voice_url_dict = None
+    @property
+    def user_data(self):
+        if self._user_data is None:
+            self._load_user_data()
+        return self._user_data
+
+    @user_data.setter
+    def user_data(self, user_data):
+        self._user_data = user_data
+        self._views = {}
+
+    def _load_user_data(self):
+        self.user_data = self._make_user_data(self._get_data())
+
+    def _make_user_data(self, data):
+        if self.compact:
+            return User.from_dict(data)
+        return Struct(**data)
+
+    def _reload_user_data(self):
+        """Reload user_data now, or on its next access in projection or lazy mode."""
+        if self.projection or self.lazy:
+            self.user_data = None
+        else:
+            self._load_user_data()
+
+    def _make_req(self, url, data=None, stream=False, headers=None):
+        if self._login_pending:
+            self._run_pending_login()
+        # Serve the response fetched to check the login to the constructor's user_data load, and drop it otherwise
+        login_check, self._login_check = self._login_check, None
+        if login_check is not None and login_check[0] == url and not data:
+            return login_check[1]
+        # Static headers (User-Agent, Authorization) and cookies are merged in from the session, as in
+        # session.request(), but proxy and certificate settings come from _environment_settings.
+        conditional = self.conditional_requests and not data and not stream
+        cached = self._conditional_response(url) if conditional else None
+        if cached is not None:
+            headers = dict(headers or {})
+            if 'ETag' in cached.headers:
+                headers['If-None-Match'] = cached.headers['ETag']
+            if 'Last-Modified' in cached.headers:
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        prepped = self.session.prepare_request(requests.Request('POST' if data else 'GET', url, json=data,
+                                                                headers=headers))
+        settings = self._environment_settings(url)
+        if stream:
+            settings = dict(settings, stream=True)
+        resp = self._send(url, prepped, settings)
+        if cached is not None and resp.status_code == 304:
+            return cached
+        if conditional and resp.status_code == 200 and ('ETag' in resp.headers or 'Last-Modified' in resp.headers):
+            self._remember_conditional_response(url, resp)
+        return resp
 
-    def _make_req(self, url, data=None):
-        headers = {}
-        if self.jwt is not None:
-            headers['Authorization'] = 'Bearer ' + self.jwt
-        headers['User-Agent'] = self.USER_AGENT
-        req = requests.Request('POST' if data else 'GET',
-                               url,
-                               json=data,
-                               headers=headers,
-                               cookies=self.session.cookies)
-        prepped = req.prepare()
-        resp = self.session.send(prepped)
-        if resp.status_code == 403 and resp.json().get("blockScript") is not None:
-            raise CaptchaException(
-                "Request to URL: {}, using user agent {}, was blocked, and requested a captcha to be solved. "
-                "Try changing the user agent and logging in again.".format(url, self.USER_AGENT)
-            )
+    def _conditional_response(self, url):
+        with self._conditional_lock:
+            cached = self._conditional_responses.get(url)
+            if cached is not None:
+                self._conditional_responses.move_to_end(url)
+            return cached
+
+    def _remember_conditional_response(self, url, resp):
+        with self._conditional_lock:
+            self._conditional_responses[url] = resp
+            self._conditional_responses.move_to_end(url)
+            self._conditional_payloads.pop(url, None)
+            while len(self._conditional_responses) > self.CONDITIONAL_CACHE_SIZE:
+                evicted, _ = self._conditional_responses.popitem(last=False)
+                self._conditional_payloads.pop(evicted, None)
+
+    def _send(self, url, prepped, settings):
+        """
+        Send a prepared request, waiting on the rate limiter and retrying throttling and server errors as the backoff
+        policy allows.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if self.hooks:
+                resp = self._send_once(url, prepped, settings, attempt)
+            else:
+                resp = self.session.send(prepped, **settings)
+            if resp.status_code == 403 and resp.json().get("blockScript") is not None:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.throttle(self.backoff.delay(attempt) if self.backoff is not None else 0)
+                raise CaptchaException(
+                    "Request to URL: {}, using user agent {}, was blocked, and requested a captcha to be solved. "
+                    "Try changing the user agent and logging in again.".format(url, self.session.headers['User-Agent'])
+                )
+            throttled = resp.status_code == 429 or resp.status_code >= 500
+            retry = self.backoff is not None and self.backoff.retries_request(prepped.method, resp.status_code, attempt)
+            delay = self.backoff.delay(attempt, resp) if retry else 0
+            if throttled and self.rate_limiter is not None:
+                # The limiter then holds back this and every other client sharing it for the delay
+                self.rate_limiter.throttle(delay)
+            elif retry:
+                time.sleep(delay)
+            if not retry:
+                return resp
+            resp.close()
+            attempt += 1
+
+    def _send_once(self, url, prepped, settings, attempt):
+        """Send a prepared request, and report its measurements to the hooks."""
+        event = RequestEvent(prepped.method, url, _endpoint_template(url), request_bytes=len(prepped.body or b""),
+                             attempt=attempt, started_at=time.time(), timings={"connect": 0.0, "tls": 0.0})
+        _request_timings.current = event.timings
+        start = time.perf_counter()
+        try:
+            resp = self.session.send(prepped, **settings)
+        except Exception as e:
+            event.error = e
+            event.timings["total"] = time.perf_counter() - start
+            for hook in self.hooks:
+                hook.on_request(event)
+            raise
+        finally:
+            _request_timings.current = None
+        event.timings["total"] = time.perf_counter() - start
+        # elapsed runs from sending the request until the headers were parsed; the body is read after that
+        headers_received = resp.elapsed.total_seconds()
+        event.timings["wait"] = max(0.0, headers_received - event.timings["connect"] - event.timings["tls"])
+        event.status = resp.status_code
+        if settings.get("stream"):
+            event.response_bytes = int(resp.headers.get("Content-Length", 0)) or None
+        else:
+            event.timings["download"] = max(0.0, event.timings["total"] - headers_received)
+            event.response_bytes = len(resp.content)
+            if resp.content:
+                start = time.perf_counter()
+                try:
+                    payload = json.loads(resp.content)
+                except ValueError:
+                    pass
+                else:
+                    event.timings["decode"] = time.perf_counter() - start
+                    # Callers get the payload decoded here instead of decoding the body again
+                    resp.json = lambda **kwargs: payload
+        for hook in self.hooks:
+            hook.on_request(event)
         return resp
 
+    def _run_pending_login(self):
+        """
+        Run the login deferred by lazy mode. Other threads wait until it has finished, and the requests it makes itself
+        go through without waiting.
+        """
+        with self._login_lock:
+            if not self._login_pending or self._logging_in:
+                return
+            self._logging_in = True
+            try:
+                self._login()
+                if self._login_check is not None:
+                    self._load_user_data()
+                self._login_pending = False
+            finally:
+                self._logging_in = False
+
+    def _environment_settings(self, url):
+        """
+        Get the proxy and certificate settings session.request() would read from the environment for a URL.
+
+        They only depend on the URL's origin, and reading them scans every environment variable, so they are read once
+        per origin and reused for later requests.
+        """
+        origin = "/".join(url.split("/", 3)[:3])
+        if origin not in self._environment_settings_by_origin:
+            self._environment_settings_by_origin[origin] = self.session.merge_environment_settings(
+                url, {}, None, None, None
+            )
+        return self._environment_settings_by_origin[origin]
+
+    def _json(self, url, resp):
+        """
+        Decode a JSON response. The decoded payload of a remembered conditional response is kept, so a 304 Not Modified
+        reply doesn't decode the document again.
+        """
+        if resp is not self._conditional_responses.get(url):
+            return resp.json()
+        payload = self._conditional_payloads.get(url)
+        if payload is None:
+            payload = resp.json()
+            with self._conditional_lock:
+                # Unless the response was replaced or evicted meanwhile
+                if self._conditional_responses.get(url) is resp:
+                    self._conditional_payloads[url] = payload
+        return payload
+
+    def _map_concurrently(self, func, items, max_workers=None):
+        """
+        Call ``func`` on every item, keeping at most ``max_workers`` calls in flight.
+
+        Yields ``(item, result, error)`` tuples in completion order. An exception raised for one item is yielded as its
+        ``error`` instead of stopping the remaining items.
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+        if max_workers <= 1:
+            for item in items:
+                try:
+                    yield item, func(item), None
+                except Exception as e:
+                    yield item, None, e
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(func, item): item for item in items}
+            for future in as_completed(futures):
+                error = future.exception()
+                yield futures[future], None if error else future.result(), error
+
     def _login(self):
         """
         Authenticate through ``https://www.duolingo.com/login``.
+
+        A token whose expiry can be read from it is trusted until shortly before it expires, without asking the server.
+        Other tokens are checked by fetching the user document, which is then loaded as user_data.
         """
         if self.jwt is None:
             self._load_session_from_file()
+        if self.jwt is None:
+            return self._login_with_password()
+        expires_at = self._jwt_claims(self.jwt).get("exp")
+        if isinstance(expires_at, (int, float)):
+            if expires_at - self.JWT_EXPIRY_MARGIN > time.time():
+                return True
+            return self._login_with_password()
         if self._check_login():
             return True
-        self.jwt = None
+        return self._login_with_password()
+
+    def _login_with_password(self):
+        """
+        Get a new session token from ``https://www.duolingo.com/login``.
 
+        The current token is left in place, for requests made from other threads meanwhile, until the new one is
+        received.
+        """
         login_url = "https://www.duolingo.com/login"
         data = {"login": self.username, "password": self.password}
-        request = self._make_req(login_url, data)
+        # A None header drops the session's Authorization from this request only
+        request = self._make_req(login_url, data, headers={'Authorization': None})
         attempt = request.json()
 
         if "failure" not in attempt:
@@ -112,6 +1512,9 @@ class Duolingo(object):
         raise DuolingoException("Login failed")
 
     def _load_session_from_file(self):
+        if self.session_store is not None:
+            self.jwt = self.session_store.get(self._original_username)
+            return
         if self.session_file is None:
             return
         try:
@@ -121,18 +1524,100 @@ class Duolingo(object):
             return
 
     def _save_session_to_file(self):
-        if self.session_file is not None:
+        if self.session_store is not None:
+            self.session_store.set(self._original_username, self.jwt)
+        elif self.session_file is not None:
             with open(self.session_file, "w") as f:
                 json.dump({"jwt_session": self.jwt}, f)
 
+    def _load_voice_cache_from_file(self, lang_abbr):
+        """
+        Get the cached skill sessions of a language which have not expired, as a dict of skill ID to
+        ``{"fetched": timestamp, "words": {word: [url, ...]}}``.
+        """
+        if self.voice_cache_file is None:
+            return {}
+        try:
+            with open(self.voice_cache_file, "r") as f:
+                skills = json.load(f).get(lang_abbr, {})
+        except (OSError, JSONDecodeError):
+            return {}
+        oldest = time.time() - self.voice_cache_ttl
+        return {skill_id: entry for skill_id, entry in skills.items() if entry["fetched"] >= oldest}
+
+    def _save_voice_cache_to_file(self, lang_abbr, skills):
+        if self.voice_cache_file is None:
+            return
+        try:
+            with open(self.voice_cache_file, "r") as f:
+                cache = json.load(f)
+        except (OSError, JSONDecodeError):
+            cache = {}
+        cache[lang_abbr] = skills
+        temp_file = "{}.{}.tmp".format(self.voice_cache_file, os.getpid())
+        with open(temp_file, "w") as f:
+            json.dump(cache, f)
+        os.replace(temp_file, self.voice_cache_file)
+
     def _check_login(self):
-        resp = self._make_req(self.get_user_url())
-        return resp.status_code == 200
+        url = self.get_user_url()
+        resp = self._make_req(url)
+        if resp.status_code != 200:
+            return False
+        # The user document is usually the next thing requested, so it is kept for that request
+        self._login_check = (url, resp)
+        return True
+
+    @staticmethod
+    def _jwt_claims(jwt):
+        """Decode the payload of a JWT, without verifying it. Returns an empty dict if it can't be decoded."""
+        try:
+            payload = jwt.split(".")[1]
+            return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode("utf-8"))
+        except (AttributeError, IndexError, ValueError):
+            return {}
 
-    def get_user_url_by_id(self, fields=None):
+    @property
+    def _user_id(self):
+        """
+        ID of the current user, taken from user_data if it is loaded, otherwise from the login token or a lookup of
+        ``https://www.duolingo.com/2017-06-30/users?username=<username>``.
+        """
+        if self._user_data is not None:
+            return self._user_data.id
+        if self.username not in self._user_ids:
+            claims = self._jwt_claims(self.jwt) if self.username == self._original_username else {}
+            if "sub" in claims:
+                self._user_ids[self.username] = claims["sub"]
+        user_id = self._lookup_user_id(self.username)
+        if user_id is None:
+            raise DuolingoException('User not found')
+        return user_id
+
+    def _lookup_user_id(self, username):
+        """
+        Get the ID of a user from ``https://www.duolingo.com/2017-06-30/users?username=<username>``, or None if there
+        is no such user.
+        """
+        if username not in self._user_ids:
+            url = 'https://www.duolingo.com/2017-06-30/users?username={}'
+            resp = self._make_req(url.format(requests.utils.quote(username)))
+            if resp.status_code == 404:
+                return None
+            if resp.status_code != 200:
+                raise DuolingoException('Could not look up user {}: HTTP {}'.format(username, resp.status_code))
+            users = resp.json().get("users")
+            if not users:
+                return None
+            self._user_ids[username] = users[0]["id"]
+        return self._user_ids[username]
+
+    def get_user_url_by_id(self, fields=None, user_id=None):
         if fields is None:
             fields = []
-        url = 'https://www.duolingo.com/2017-06-30/users/{}'.format(self.user_data.id)
+        if user_id is None:
+            user_id = self._user_id
+        url = 'https://www.duolingo.com/2017-06-30/users/{}'.format(user_id)
         fields_params = requests.utils.requote_uri(','.join(fields))
         if fields_params:
             url += '?fields={}'.format(fields_params)
@@ -143,9 +1628,9 @@ class Duolingo(object):
 
     def set_username(self, username):
         self.username = username
-        self.user_data = Struct(**self._get_data())
+        self._reload_user_data()
 
-    def get_leaderboard(self, unit, before):
+    def get_leaderboard(self, unit, before, top=None):
         """
         Get user's rank in the week in descending order, stream from
         ``https://www.duolingo.com/friendships/leaderboard_activity?unit=week&_=time
@@ -154,6 +1639,8 @@ class Duolingo(object):
         :type unit: str
         :param before: Datetime in format '2015-07-06 05:42:24'
         :type before: Union[datetime, str]
+        :param top: Only return this many of the highest ranked friends
+        :type top: int
         :rtype: List
         """
         if not unit:
@@ -169,21 +1656,23 @@ class Duolingo(object):
         url = url.format(unit, before)
 
         self.leader_data = self._make_req(url).json()
+        ranking = {int(user_id): points for user_id, points in self.leader_data['ranking'].items()}
         data = []
         for result in self.get_friends():
-            for value in self.leader_data['ranking']:
-                if result['id'] == int(value):
-                    temp = {'points': int(self.leader_data['ranking'][value]),
-                            'unit': unit,
-                            'id': result['id'],
-                            'username': result['username']}
-                    data.append(temp)
+            if result['id'] in ranking:
+                temp = {'points': int(ranking[result['id']]),
+                        'unit': unit,
+                        'id': result['id'],
+                        'username': result['username']}
+                data.append(temp)
 
+        if top is not None:
+            return heapq.nlargest(top, data, key=lambda user: user['points'])
         return sorted(data, key=lambda user: user['points'], reverse=True)
 
     def buy_item(self, item_name, abbr):
         url = 'https://www.duolingo.com/2017-06-30/users/{}/shop-items'
-        url = url.format(self.user_data.id)
+        url = url.format(self._user_id)
 
         data = {'itemName': item_name, 'learningLanguage': abbr}
         request = self._make_req(url, data)
@@ -252,7 +1741,7 @@ class Duolingo(object):
         try:
             parse = request.json()['tracking_properties']
             if parse['learning_language'] == lang:
-                self.user_data = Struct(**self._get_data())
+                self._reload_user_data()
         except ValueError:
             raise DuolingoException('Failed to switch language')
 
@@ -262,21 +1751,100 @@ class Duolingo(object):
         """
         if fields is None:
             fields = []
-        get = self._make_req(self.get_user_url_by_id(fields))
+        url = self.get_user_url_by_id(fields)
+        get = self._make_req(url)
         if get.status_code == 404:
             raise DuolingoException('User not found')
         else:
-            return get.json()
+            return self._json(url, get)
 
-    def _get_data(self):
+    def get_users(self, usernames_or_ids, fields=None, max_workers=None):
+        """
+        Get the data of many users at once, from ``https://www.duolingo.com/2017-06-30/users/<user_id>``.
+
+        The client's own user and user_data are left unchanged.
+
+        :param usernames_or_ids: Usernames (str) or user IDs (int) of the users to get
+        :param fields: Fields of the user data to request. Defaults to all of them.
+        :type fields: list of str
+        :param max_workers: Number of requests kept in flight. Defaults to ``self.max_workers``.
+        :type max_workers: int
+        :return: Dict of each username or ID to the user's read-only data, or None if the user was not found
+        """
+        return dict(self.iter_users(usernames_or_ids, fields, max_workers))
+
+    def iter_users(self, usernames_or_ids, fields=None, max_workers=None):
+        """
+        Like :meth:`get_users`, but yields ``(username_or_id, user)`` tuples as each request completes.
+        """
+        fetched = self._map_concurrently(lambda user: self._get_frozen_user(user, fields), usernames_or_ids,
+                                         max_workers)
+        for username_or_id, user, error in fetched:
+            if error is not None:
+                raise error
+            yield username_or_id, user
+
+    def _get_frozen_user(self, username_or_id, fields):
+        if isinstance(username_or_id, int):
+            user_id = username_or_id
+        else:
+            user_id = self._lookup_user_id(username_or_id)
+            if user_id is None:
+                return None
+        get = self._make_req(self.get_user_url_by_id(fields, user_id))
+        if get.status_code == 404:
+            return None
+        if get.status_code != 200:
+            raise DuolingoException('Could not get user {}: HTTP {}'.format(username_or_id, get.status_code))
+        return self._freeze(get.json())
+
+    @staticmethod
+    def _freeze(data):
+        """Copy decoded JSON into read-only mappings and tuples."""
+        if isinstance(data, dict):
+            return MappingProxyType({key: Duolingo._freeze(value) for key, value in data.items()})
+        if isinstance(data, list):
+            return tuple(Duolingo._freeze(value) for value in data)
+        return data
+
+    def _get_data(self, unchanged=None):
         """
         Get user's data from ``https://www.duolingo.com/users/<username>``.
+
+        :param unchanged: Response remembered for a conditional request. None is returned instead of the data if the
+        server answers 304 Not Modified, so user_data built from it is known to be current without decoding it again.
         """
-        get = self._make_req(self.get_user_url())
+        url = self.get_user_url()
+        get = self._make_req(url)
         if get.status_code == 404:
             raise Exception('User not found')
-        else:
-            return get.json()
+        if unchanged is not None and get is unchanged:
+            return None
+        return self._json(url, get)
+
+    def refresh(self):
+        """
+        Reload user_data from ``https://www.duolingo.com/users/<username>``.
+
+        With conditional_requests, an unchanged document isn't downloaded again.
+
+        :return: Whether the user's data changed
+        :rtype: bool
+        """
+        previous = self._user_data
+        remembered = None
+        if self.conditional_requests and previous is not None:
+            remembered = self._conditional_response(self.get_user_url())
+        data = self._get_data(unchanged=remembered)
+        if data is None:
+            return False
+        user_data = self._make_user_data(data)
+        if previous is not None:
+            unchanged = previous == user_data if self.compact else vars(previous) == vars(user_data)
+            if unchanged:
+                return False
+        self.user_data = user_data
+        return True
 
     @staticmethod
     def _make_dict(keys, array):
@@ -291,48 +1859,147 @@ class Duolingo(object):
         return data
 
     @staticmethod
-    def _compute_dependency_order_func(skills):
-        # Create dictionary:
-        skills_dict = {}
-        for skill in skills:
-            skills_dict[skill['name']] = skill
-        # Get ordinal for all dependencies
+    def _compute_dependency_order(skills):
+        """
+        Get a dict of skill name to dependency order: 1 for skills without dependencies, otherwise one more than the
+        highest order of the skill's dependencies. Dependencies on skills which are not listed are ignored.
+
+        Skills are visited in topological order (Kahn's algorithm), so this takes time linear in the number of skills
+        and dependencies, and does not modify the skills.
+        """
+        names = {skill['name'] for skill in skills}
+        dependencies = {}
+        dependents = {name: [] for name in names}
         for skill in skills:
-            skill['dependency_order'] = Duolingo._get_skill_ordinal(skills_dict, skill, [])
+            dependencies[skill['name']] = {name for name in skill['dependencies_name'] if name in names}
+            for name in dependencies[skill['name']]:
+                dependents[name].append(skill['name'])
+        remaining = {name: len(skill_dependencies) for name, skill_dependencies in dependencies.items()}
+        order = {name: 1 for name, count in remaining.items() if count == 0}
+        ready = deque(order)
+        visited = 0
+        while ready:
+            name = ready.popleft()
+            visited += 1
+            for dependent in dependents[name]:
+                order[dependent] = max(order.get(dependent, 0), order[name] + 1)
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if visited < len(names):
+            raise DuolingoException("Loop encountered: {}".format(Duolingo._find_loop(dependencies, remaining)))
+        return order
 
     @staticmethod
-    def _get_skill_ordinal(skills_dict, skill, breadcrumbs):
-        # If name is already in breadcrumbs, we've found a loop
-        if skill['name'] in breadcrumbs:
-            raise DuolingoException("Loop encountered: {}".format(breadcrumbs + [skill['name']]))
-        # If order already set for this skill, return it
-        if "dependency_order" in skill:
-            return skill["dependency_order"]
-        # If no dependencies, set order on this skill to 1
-        if not skill['dependencies_name']:
-            skill['dependency_order'] = 1
-            return 1
-        # Calculate order based on order of dependencies
-        new_breadcrumbs = breadcrumbs + [skill['name']]
-        order = 1 + max(
-            [
-                Duolingo._get_skill_ordinal(
-                    skills_dict,
-                    skills_dict[name],
-                    new_breadcrumbs
-                )
-                for name in skill['dependencies_name']
-            ]
-        )
-        skill["dependency_order"] = order
-        return order
+    def _find_loop(dependencies, remaining):
+        """
+        Get a list of skill names forming a loop, starting and ending with the same skill, out of the skills which the
+        topological sort could not reach.
+        """
+        # Every unreached skill has an unreached dependency, so following them must eventually repeat a skill
+        path = []
+        positions = {}
+        name = next(name for name, count in remaining.items() if count > 0)
+        while name not in positions:
+            positions[name] = len(path)
+            path.append(name)
+            name = next(dependency for dependency in sorted(dependencies[name]) if remaining[dependency] > 0)
+        return path[positions[name]:] + [name]
+
+    # Keys of the legacy user document which can be projected from the 2017-06-30 user API, as the fields to request
+    # and a function computing the key's value from the response.
+    _PROJECTIONS = {
+        'id': (['id'], lambda data: data['id']),
+        'username': (['username'], lambda data: data['username']),
+        'bio': (['bio'], lambda data: data['bio']),
+        'location': (['location'], lambda data: data['location']),
+        'fullname': (['name'], lambda data: data['name']),
+        'avatar': (['picture'], lambda data: data['picture']),
+        'ui_language': (['fromLanguage'], lambda data: data['fromLanguage']),
+        'learning_language': (['learningLanguage'], lambda data: data['learningLanguage']),
+        'site_streak': (['streak'], lambda data: data['streak']),
+        'daily_goal': (['xpGoal'], lambda data: data['xpGoal']),
+        'streak_extended_today': (['xpGains', 'streakData'],
+                                  lambda data: bool(Duolingo._lessons_since_midnight(data))),
+    }
+
+    def _get_user_fields(self, keys):
+        """
+        Get a dict of keys of the legacy user document. In projection mode, if user_data is not loaded yet and every
+        key can be projected, only the fields needed for them are requested.
+        """
+        if not self.projection or self._user_data is not None or not all(key in self._PROJECTIONS for key in keys):
+            return self._make_dict(keys, self.user_data)
+        fields = sorted({field for key in keys for field in self._PROJECTIONS[key][0]})
+        data = self.get_data_by_user_id(fields)
+        return {key: self._PROJECTIONS[key][1](data) for key in keys}
+
+    def _view(self, key, build):
+        """
+        Get a lookup structure derived from user_data, which is built once and then kept until user_data is reloaded.
+
+        :param key: Hashable name of the view
+        :param build: Function building the view from user_data
+        """
+        view = self._views.get(key)
+        if view is None:
+            view = build()
+            # Read after building, since loading user_data in build() replaces self._views
+            self._views[key] = view
+        return view
+
+    def _languages_view(self):
+        def build():
+            view = {'by_abbr': {}, 'by_name': {}, 'by_lower_name': {}, 'learning': []}
+            for lang in self.user_data.languages:
+                view['by_abbr'].setdefault(lang['language'], lang)
+                view['by_name'].setdefault(lang['language_string'], lang)
+                view['by_lower_name'].setdefault(lang['language_string'].lower(), lang)
+                if lang['learning']:
+                    view['learning'].append(lang)
+            return view
+        return self._view('languages', build)
+
+    def _skills_view(self, lang):
+        def build():
+            skills = self.user_data.language_data[lang]['skills']
+            learned = [skill for skill in skills if skill['learned']]
+            words = []
+            for skill in learned:
+                words += skill['words']
+            return {
+                'by_id': {skill['id']: skill for skill in skills},
+                'by_name': {skill['name']: skill for skill in skills},
+                'known_words': list(set(words)),
+                'known_topics': [skill['title'] for skill in learned],
+                'unknown_topics': [skill['title'] for skill in skills if not skill['learned']],
+                'golden_topics': [skill['title'] for skill in learned if skill['strength'] == 1.0],
+                'reviewable_topics': [skill['title'] for skill in learned if skill['strength'] < 1.0],
+            }
+        return self._view(('skills', lang), build)
+
+    def _vocabulary_view(self, language_abbr=None):
+        if self.username != self._original_username:
+            raise OtherUserException("Vocab cannot be listed when the user has been switched.")
+
+        if language_abbr and not self._is_current_language(language_abbr):
+            self._switch_language(language_abbr)
+
+        def build():
+            entries = self.get_vocabulary()['vocab_overview']
+            view = {'entries': entries, 'by_word': {}, 'by_lexeme_id': {}}
+            for position, word_data in enumerate(entries):
+                view['by_word'].setdefault(word_data['normalized_string'], word_data)
+                view['by_lexeme_id'].setdefault(word_data['lexeme_id'], []).append(position)
+            return view
+        return self._view(('vocabulary', language_abbr), build)
 
     def get_settings(self):
         """Get user settings."""
         keys = ['notify_comment', 'deactivated', 'is_follower_by',
                 'is_following']
 
-        return self._make_dict(keys, self.user_data)
+        return self._get_user_fields(keys)
 
     def get_languages(self, abbreviations=False):
         """
@@ -343,37 +2010,22 @@ class Duolingo(object):
         :return: List of languages
         :rtype: list of str
         """
-        data = []
-
-        for lang in self.user_data.languages:
-            if lang['learning']:
-                if abbreviations:
-                    data.append(lang['language'])
-                else:
-                    data.append(lang['language_string'])
-        return data
+        key = 'language' if abbreviations else 'language_string'
+        return [lang[key] for lang in self._languages_view()['learning']]
 
     def get_language_from_abbr(self, abbr):
         """Get language full name from abbreviation."""
-        for language in self.user_data.languages:
-            if language['language'] == abbr:
-                return language['language_string']
-        return None
+        language = self._languages_view()['by_abbr'].get(abbr)
+        return language['language_string'] if language else None
 
     def get_abbreviation_of(self, name):
         """Get abbreviation of a language."""
-        for language in self.user_data.languages:
-            if language['language_string'].lower() == name.lower():
-                return language['language']
-        return None
+        language = self._languages_view()['by_lower_name'].get(name.lower())
+        return language['language'] if language else None
 
     def get_language_details(self, language):
         """Get user's status about a language."""
-        for lang in self.user_data.languages:
-            if language == lang['language_string']:
-                return lang
-
-        return {}
+        return self._languages_view()['by_name'].get(language, {})
 
     def get_user_info(self):
         """Get user's informations."""
@@ -383,12 +2035,12 @@ class Duolingo(object):
                   'admin', 'invites_left', 'location', 'fullname', 'avatar',
                   'ui_language']
 
-        return self._make_dict(fields, self.user_data)
+        return self._get_user_fields(fields)
 
     def get_streak_info(self):
         """Get user's streak informations."""
         fields = ['daily_goal', 'site_streak', 'streak_extended_today']
-        return self._make_dict(fields, self.user_data)
+        return self._get_user_fields(fields)
 
     def _is_current_language(self, abbr):
         """Get if user is learning a language."""
@@ -431,52 +2083,39 @@ class Duolingo(object):
 
     def get_known_words(self, lang):
         """Get a list of all words learned by user in a language."""
-        words = []
-        for topic in self.user_data.language_data[lang]['skills']:
-            if topic['learned']:
-                words += topic['words']
-        return list(set(words))
+        return list(self._skills_view(lang)['known_words'])
 
     def get_learned_skills(self, lang):
         """
         Return the learned skill objects sorted by the order they were learned
         in.
         """
-        skills = [
-            skill for skill in self.user_data.language_data[lang]['skills']
-        ]
-
-        self._compute_dependency_order_func(skills)
+        def build():
+            skills = self.user_data.language_data[lang]['skills']
+            order = self._compute_dependency_order(skills)
+            return [dict(skill, dependency_order=order[skill['name']])
+                    for skill in sorted(skills, key=lambda skill: order[skill['name']])
+                    if skill['learned']]
 
-        return [skill for skill in
-                sorted(skills, key=lambda skill: skill['dependency_order'])
-                if skill['learned']]
+        return list(self._view(('learned_skills', lang), build))
 
     def get_known_topics(self, lang):
         """Return the topics learned by a user in a language."""
-        return [topic['title']
-                for topic in self.user_data.language_data[lang]['skills']
-                if topic['learned']]
+        return list(self._skills_view(lang)['known_topics'])
 
     def get_unknown_topics(self, lang):
         """Return the topics remaining to learn by a user in a language."""
-        return [topic['title']
-                for topic in self.user_data.language_data[lang]['skills']
-                if not topic['learned']]
+        return list(self._skills_view(lang)['unknown_topics'])
 
     def get_golden_topics(self, lang):
         """Return the topics mastered ("golden") by a user in a language."""
-        return [topic['title']
-                for topic in self.user_data.language_data[lang]['skills']
-                if topic['learned'] and topic['strength'] == 1.0]
+        return list(self._skills_view(lang)['golden_topics'])
 
     def get_reviewable_topics(self, lang):
         """Return the topics learned but not golden by a user in a language."""
-        return [topic['title']
-                for topic in self.user_data.language_data[lang]['skills']
-                if topic['learned'] and topic['strength'] < 1.0]
+        return list(self._skills_view(lang)['reviewable_topics'])
 
-    def get_translations(self, words, source=None, target=None):
+    def get_translations(self, words, source=None, target=None, max_workers=None):
         """
         Get words' translations from
         ``https://d2.duolingo.com/api/1/dictionary/hints/<source>/<target>?tokens=``<words>``
@@ -487,41 +2126,74 @@ class Duolingo(object):
         :type source: str
         :param target: Destination language as abbreviation
         :type target: str
+        :param max_workers: Number of segment requests kept in flight for long word lists. Defaults to
+        ``self.max_workers``.
+        :type max_workers: int
         :return: Dict with words as keys and translations as values
+
+        When the client has a ``translation_cache``, only the words missing from it are requested.
         """
         if not source:
             source = self.user_data.ui_language
         if not target:
             target = list(self.user_data.language_data.keys())[0]
 
+        if self.translation_cache is None:
+            return self._fetch_translations(words, source, target, max_workers)
+        if isinstance(words, str):
+            words = [words]
+        results = {
+            key[2]: translations
+            for key, translations in self.translation_cache.get_many((source, target, word) for word in words).items()
+        }
+        missing_words = [word for word in words if word not in results]
+        if missing_words:
+            fetched = self._fetch_translations(missing_words, source, target, max_workers)
+            self.translation_cache.set_many({(source, target, word): fetched[word] for word in fetched})
+            results.update(fetched)
+        return results
+
+    def _fetch_translations(self, words, source, target, max_workers):
         list_segments = self._segment_translations_list(words)
+        segment_results = [None] * len(list_segments)
+        fetched = self._map_concurrently(
+            lambda index: self._get_raw_translations(list_segments[index], source, target),
+            range(len(list_segments)),
+            max_workers
+        )
+        for index, translations, error in fetched:
+            if error is not None:
+                raise error
+            segment_results[index] = translations
+        # Merge in segment order, so repeated words resolve the same way however the requests completed
         results = dict()
-        for segment in list_segments:
-            results = {**results, **self._get_raw_translations(segment, source, target)}
+        for translations in segment_results:
+            results.update(translations)
         return results
 
-    def _segment_translations_list(self, words):
+    @staticmethod
+    def _segment_translations_list(words):
         # These seem to be the length limits before Duolingo's API rejects the request
         word_count_limit = 2000
         word_json_limit = 12800
 
-        # Handy internal function
-        def is_word_list_valid(word_list):
-            return (
-                len(word_list) < word_count_limit
-                and len(json.dumps(word_list)) < word_json_limit
-            )
         # Fast return for simple lists
-        if is_word_list_valid(words):
+        if len(words) < word_count_limit and len(json.dumps(words)) < word_json_limit:
             return [words]
-        # Start building segments until they trip the limits
+        # Start building segments until they trip the limits. The JSON length of a segment is tracked as it grows:
+        # json.dumps(segment) is the brackets, each encoded word, and a ", " between consecutive words.
         segments = []
         segment = []
+        segment_json_length = len("[]")
         for word in words:
-            if not is_word_list_valid(segment + [word]):
+            word_json_length = len(json.dumps(word))
+            new_json_length = segment_json_length + word_json_length + (len(", ") if segment else 0)
+            if len(segment) + 1 >= word_count_limit or new_json_length >= word_json_limit:
                 segments.append(segment)
                 segment = []
+                new_json_length = len("[]") + word_json_length
             segment.append(word)
+            segment_json_length = new_json_length
         segments.append(segment)
         return segments
 
@@ -530,7 +2202,9 @@ class Duolingo(object):
         url = "https://d2.duolingo.com/api/1/dictionary/hints/{}/{}?tokens={}" \
             .format(target, source, word_parameter)
 
-        request = self.session.get(url)
+        request = self._make_req(url)
+        if request.status_code != 200:
+            raise DuolingoException('Could not get translations: HTTP {}'.format(request.status_code))
         try:
             return request.json()
         except ValueError:
@@ -546,10 +2220,44 @@ class Duolingo(object):
 
         overview_url = "https://www.duolingo.com/vocabulary/overview"
         overview_request = self._make_req(overview_url)
-        overview = overview_request.json()
+        overview = self._json(overview_url, overview_request)
 
         return overview
 
+    def iter_vocabulary(self, language_abbr=None):
+        """
+        Like :meth:`get_vocabulary`, but yields the entries of ``vocab_overview`` one at a time while the response is
+        downloaded, so memory use doesn't grow with the size of the vocabulary.
+        """
+        if self.username != self._original_username:
+            raise OtherUserException("Vocab cannot be listed when the user has been switched.")
+
+        if language_abbr and not self._is_current_language(language_abbr):
+            self._switch_language(language_abbr)
+
+        overview_url = "https://www.duolingo.com/vocabulary/overview"
+        return self._iter_json_array(overview_url, ('vocab_overview',))
+
+    def iter_skills(self, language_abbr=None):
+        """
+        Yield the skills in ``https://www.duolingo.com/users/<username>`` one at a time while the document is
+        downloaded, without loading it into user_data.
+
+        :param language_abbr: Only yield the skills of this language. Defaults to every language in the document, which
+        is usually only the current learning language.
+        """
+        return self._iter_json_array(self.get_user_url(), ('language_data', language_abbr, 'skills'))
+
+    def _iter_json_array(self, url, path):
+        resp = self._make_req(url, stream=True)
+        try:
+            if resp.status_code == 404:
+                raise DuolingoException('Not found: {}'.format(url))
+            for item in _JSONArrayStream(resp.iter_content(64 * 1024), path):
+                yield item
+        finally:
+            resp.close()
+
     _cloudfront_server_url = None
     _homepage_text = None
 
@@ -606,7 +2314,7 @@ class Duolingo(object):
             raise DuolingoException("This language is not one you are studying")
         # Populate voice url dict
         if self.voice_url_dict is None or language_abbr not in self.voice_url_dict:
-            self._populate_voice_url_dictionary(language_abbr)
+            self.populate_audio_urls(language_abbr)
         # If no audio exists for a word, return None
         if word not in self.voice_url_dict[language_abbr]:
             return None
@@ -623,60 +2331,128 @@ class Duolingo(object):
             return random.choice(word_links)
         return word_links[0]
 
-    def _populate_voice_url_dictionary(self, lang_abbr):
+    def populate_audio_urls(self, lang, max_workers=None, progress_callback=None):
+        """
+        Scrape a practice session of every skill in a language to collect the audio URLs used by
+        :meth:`get_audio_url`. It is called by the first :meth:`get_audio_url` for a language, which can't report
+        skills that failed; call it beforehand to follow the progress, and to find out which skills failed.
+
+        :param lang: Abbreviation of the language to scrape
+        :param max_workers: Number of session requests kept in flight. Defaults to ``self.max_workers``.
+        :param progress_callback: Called as ``progress_callback(done, total, skill_id, error)`` after each skill,
+        where ``error`` is the exception raised while fetching that skill, or None.
+        :return: Dict of skill ID to exception, for the skills which could not be fetched
+        """
+        if lang not in self.user_data.language_data:
+            raise DuolingoException("This language is not one you are studying")
         if self.voice_url_dict is None:
             self.voice_url_dict = {}
-        self.voice_url_dict[lang_abbr] = {}
+        self.voice_url_dict[lang] = {}
         # Get skill IDs
         skill_ids = []
-        for skill in self.user_data.language_data[lang_abbr]['skills']:
+        for skill in self.user_data.language_data[lang]['skills']:
             skill_ids.append(skill['id'])
-        # Scrape all sessions and create voice url dictionary
-        for skill_id in skill_ids:
-            req_data = {
-                "fromLanguage": "en" if lang_abbr != "en" else "de",
-                "learningLanguage": lang_abbr,
-                "challengeTypes": ["definition", "translate"],
-                "skillId": skill_id,
-                "type": "SKILL_PRACTICE",
-                "juicy": True,
-                "smartTipsVersion": 2
-            }
-            resp = self._make_req("https://www.duolingo.com/2017-06-30/sessions", req_data)
-            if resp.status_code != 200:
-                continue
-            resp_data = resp.json()
-            for challenge in resp_data['challenges']:
-                if "prompt" in challenge and "tts" in challenge:
-                    self._add_to_voice_url_dict(lang_abbr, challenge['prompt'], challenge['tts'])
-                if challenge.get("metadata") and challenge['metadata'].get("non_character_tts"):
-                    for word, url in challenge['metadata']['non_character_tts']['tokens'].items():
-                        self._add_to_voice_url_dict(lang_abbr, word, url)
-                if "tokens" in challenge:
-                    self._add_token_list_to_voice_url_dict(lang_abbr, challenge["tokens"])
-
-    def _add_token_list_to_voice_url_dict(self, lang_abbr, token_list):
+        # Reuse cached sessions of skills the user still has, and only scrape the rest
+        cached = self._load_voice_cache_from_file(lang)
+        cached = {skill_id: cached[skill_id] for skill_id in skill_ids if skill_id in cached}
+        for entry in cached.values():
+            self._merge_voice_urls(self.voice_url_dict[lang], entry["words"])
+        missing_skill_ids = [skill_id for skill_id in skill_ids if skill_id not in cached]
+        # Scrape remaining sessions and merge them into the voice url dictionary as they complete
+        failures = {}
+        fetched = self._map_concurrently(
+            lambda skill_id: self._get_skill_voice_urls(lang, skill_id), missing_skill_ids, max_workers
+        )
+        for done, (skill_id, voice_urls, error) in enumerate(fetched, 1):
+            if error is not None:
+                failures[skill_id] = error
+            else:
+                self._merge_voice_urls(self.voice_url_dict[lang], voice_urls)
+                cached[skill_id] = {"fetched": time.time(),
+                                    "words": {word: sorted(urls) for word, urls in voice_urls.items()}}
+            if progress_callback is not None:
+                progress_callback(done, len(missing_skill_ids), skill_id, error)
+        if missing_skill_ids:
+            self._save_voice_cache_to_file(lang, cached)
+        return failures
+
+    def _get_skill_voice_urls(self, lang_abbr, skill_id):
+        """Get a dict of word to audio URLs from a practice session of one skill."""
+        req_data = {
+            "fromLanguage": "en" if lang_abbr != "en" else "de",
+            "learningLanguage": lang_abbr,
+            "challengeTypes": ["definition", "translate"],
+            "skillId": skill_id,
+            "type": "SKILL_PRACTICE",
+            "juicy": True,
+            "smartTipsVersion": 2
+        }
+        resp = self._make_req("https://www.duolingo.com/2017-06-30/sessions", req_data)
+        if resp.status_code != 200:
+            raise DuolingoException("Could not get session for skill {}".format(skill_id))
+        voice_urls = {}
+        for challenge in resp.json()['challenges']:
+            if "prompt" in challenge and "tts" in challenge:
+                self._add_to_voice_url_dict(voice_urls, challenge['prompt'], challenge['tts'])
+            if challenge.get("metadata") and challenge['metadata'].get("non_character_tts"):
+                for word, url in challenge['metadata']['non_character_tts']['tokens'].items():
+                    self._add_to_voice_url_dict(voice_urls, word, url)
+            if "tokens" in challenge:
+                self._add_token_list_to_voice_url_dict(voice_urls, challenge["tokens"])
+        return voice_urls
+
+    @staticmethod
+    def _merge_voice_urls(voice_urls, new_voice_urls):
+        for word, urls in new_voice_urls.items():
+            if word not in voice_urls:
+                voice_urls[word] = set()
+            voice_urls[word].update(urls)
+
+    def _add_token_list_to_voice_url_dict(self, voice_urls, token_list):
         for token in token_list:
             if isinstance(token, list):
-                self._add_token_list_to_voice_url_dict(lang_abbr, token)
+                self._add_token_list_to_voice_url_dict(voice_urls, token)
             if isinstance(token, dict) and token.get("tts") and token.get("value"):
-                self._add_to_voice_url_dict(lang_abbr, token['value'], token['tts'])
+                self._add_to_voice_url_dict(voice_urls, token['value'], token['tts'])
 
-    def _add_to_voice_url_dict(self, lang_abbr, word, url):
+    @staticmethod
+    def _add_to_voice_url_dict(voice_urls, word, url):
         word = word.lower()
-        if word not in self.voice_url_dict[lang_abbr]:
-            self.voice_url_dict[lang_abbr][word] = set()
-        self.voice_url_dict[lang_abbr][word].add(url)
+        if word not in voice_urls:
+            voice_urls[word] = set()
+        voice_urls[word].add(url)
 
     def get_related_words(self, word, language_abbr=None):
-        overview = self.get_vocabulary(language_abbr)
+        """
+        Get the entries of the user's vocabulary related to a word. The vocabulary is downloaded and indexed once, and
+        kept until user_data is reloaded.
 
-        for word_data in overview['vocab_overview']:
-            if word_data['normalized_string'] == word.lower():
-                related_lexemes = word_data['related_lexemes']
-                return [w for w in overview['vocab_overview']
-                        if w['lexeme_id'] in related_lexemes]
+        :param word: The word to look up
+        :param language_abbr: Abbreviation of the language; the current language if None
+        :return: The related entries, in vocabulary order, or None if the word isn't in the vocabulary
+        """
+        return self.get_related_words_batch([word], language_abbr)[word]
 
+    def get_related_words_batch(self, words, language_abbr=None):
+        """
+        Get the entries of the user's vocabulary related to each of several words.
+
+        :param words: The words to look up
+        :param language_abbr: Abbreviation of the language; the current language if None
+        :return: A dict of each word to its related entries, or to None if it isn't in the vocabulary
+        """
+        view = self._vocabulary_view(language_abbr)
+        related_words = {}
+        for word in words:
+            word_data = view['by_word'].get(word.lower())
+            if word_data is None:
+                related_words[word] = None
+                continue
+            positions = []
+            for lexeme_id in set(word_data['related_lexemes']):
+                positions += view['by_lexeme_id'].get(lexeme_id, [])
+            related_words[word] = [view['entries'][position] for position in sorted(positions)]
+        return related_words
 
     def get_word_definition_by_id(self, lexeme_id):
         """
@@ -689,21 +2465,56 @@ class Duolingo(object):
         """
         url = "https://www.duolingo.com/api/1/dictionary_page?lexeme_id=%s" % lexeme_id
 
-        request = self.session.get(url)
+        request = self._make_req(url)
+        if request.status_code != 200:
+            raise DuolingoException('Could not get word definition of {}: HTTP {}'.format(lexeme_id,
+                                                                                         request.status_code))
 
         try:
             return request.json()
-        except:
-            raise Exception('Could not get word definition')
+        except ValueError:
+            raise DuolingoException('Could not get word definition of {}'.format(lexeme_id))
 
-    def get_daily_xp_progress(self):
-        daily_progress = self.get_data_by_user_id(["xpGoal", "xpGains", "streakData"])
+    def get_word_definitions(self, lexeme_ids, max_workers=None, rate_limiter=None):
+        """
+        Get the dictionary entries of many words, as returned by :meth:`get_word_definition_by_id`.
 
-        if not daily_progress:
-            raise DuolingoException(
-                "Could not get daily XP progress for user \"{}\". Are you logged in as that user?".format(self.username)
-            )
+        When the client has a ``definition_cache``, only the entries missing from it are requested.
+
+        :param lexeme_ids: Identifiers of the words
+        :type: list of str
+        :param max_workers: Number of requests kept in flight. Defaults to ``self.max_workers``.
+        :type max_workers: int
+        :param rate_limiter: :class:`RateLimiter` that every request waits on, to stay below a request rate.
+        :return: A tuple of a dict of lexeme ID to dictionary entry, and a dict of lexeme ID to the exception raised
+        while fetching it, for the entries which could not be fetched.
+        """
+        definitions = {}
+        if self.definition_cache is not None:
+            cached = self.definition_cache.get_many(("dictionary_page", lexeme_id) for lexeme_id in lexeme_ids)
+            definitions.update((key[1], definition) for key, definition in cached.items())
+        missing_ids = [lexeme_id for lexeme_id in dict.fromkeys(lexeme_ids) if lexeme_id not in definitions]
+
+        def fetch(lexeme_id):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            return self.get_word_definition_by_id(lexeme_id)
+
+        fetched = {}
+        errors = {}
+        for lexeme_id, definition, error in self._map_concurrently(fetch, missing_ids, max_workers):
+            if error is not None:
+                errors[lexeme_id] = error
+            else:
+                fetched[lexeme_id] = definition
+        if self.definition_cache is not None and fetched:
+            self.definition_cache.set_many({("dictionary_page", lexeme_id): definition
+                                            for lexeme_id, definition in fetched.items()})
+        definitions.update(fetched)
+        return definitions, errors
 
+    @staticmethod
+    def _lessons_since_midnight(daily_progress):
         # xpGains lists the lessons completed on the last day where lessons were done.
         # We use the streakData.updatedTimestamp to get the last "midnight", and get lessons after that.
         reported_timestamp = daily_progress['streakData']['updatedTimestamp']
@@ -715,9 +2526,19 @@ class Duolingo(object):
         time_discrepancy = min(midnight - reported_midnight, timedelta(0))
         update_cutoff = round((reported_midnight + time_discrepancy).timestamp())
 
-        lessons = [lesson for lesson in daily_progress['xpGains'] if
+        return [lesson for lesson in daily_progress['xpGains'] if
                 lesson['time'] > update_cutoff]
 
+    def get_daily_xp_progress(self):
+        daily_progress = self.get_data_by_user_id(["xpGoal", "xpGains", "streakData"])
+
+        if not daily_progress:
+            raise DuolingoException(
+                "Could not get daily XP progress for user \"{}\". Are you logged in as that user?".format(self.username)
+            )
+
+        lessons = self._lessons_since_midnight(daily_progress)
+
         return {
             "xp_goal": daily_progress['xpGoal'],
             "lessons_today": lessons,
@@ -725,6 +2546,223 @@ class Duolingo(object):
         }
 
 
+class DuolingoPool(object):
+    """
+    Clients for many accounts, which share connection pools, a :class:`SessionStore` and a pool of worker threads.
+
+    Clients are created lazily from the stored tokens, so building a pool makes no requests. Tokens which expire within
+    ``refresh_margin`` seconds are renewed before a client is used, and by :meth:`refresh_sessions`, which can also run
+    in the background with :meth:`start_refresher`. When several processes share the store, only one of them renews a
+    given account's token, and the others pick the new token up from the store. They keep using the current token
+    meanwhile, unless it has expired already, in which case they wait for the new one.
+    """
+    # Number of seconds between checks of the store while waiting for another client to renew an expired token
+    LEASE_POLL_INTERVAL = 0.5
+
+    def __init__(self, accounts, session_store, *, max_workers=8, refresh_margin=24 * 60 * 60, adapters=None,
+                 **client_options):
+        """
+        :param accounts: Dict of username to password. The password may be None for accounts whose token is already in
+        the session store, but their token can then not be renewed.
+        :param session_store: :class:`SessionStore` the accounts' tokens are kept in
+        :param max_workers: Number of worker threads
+        :param refresh_margin: Number of seconds before its expiry that a token is renewed
+        :param adapters: Transport adapters shared by the clients. Defaults to the ones from :func:`make_adapters`.
+        :param client_options: Other keyword arguments for :class:`Duolingo`
+        """
+        self.accounts = dict(accounts)
+        self.session_store = session_store
+        self.refresh_margin = refresh_margin
+        self.adapters = adapters if adapters is not None else make_adapters(pool_maxsize=max_workers)
+        self.client_options = client_options
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._refresher = None
+        self._stop_refresher = threading.Event()
+
+    def client(self, username):
+        """Get the client of an account, with a session token that isn't about to expire."""
+        with self._lock:
+            client = self._clients.get(username)
+            if client is None:
+                client = self._clients[username] = Duolingo(
+                    username, self.accounts[username], jwt=self.session_store.get(username),
+                    session_store=self.session_store, adapters=self.adapters, lazy=True, **self.client_options
+                )
+        self._refresh_if_expiring(client)
+        return client
+
+    def _expiring(self, jwt):
+        expires_at = Duolingo._jwt_claims(jwt).get("exp")
+        return expires_at is not None and expires_at - self.refresh_margin < time.time()
+
+    @staticmethod
+    def _expired(jwt):
+        expires_at = Duolingo._jwt_claims(jwt).get("exp")
+        return expires_at is not None and expires_at - Duolingo.JWT_EXPIRY_MARGIN < time.time()
+
+    def _refresh_if_expiring(self, client):
+        if client.jwt is None or not self._expiring(client.jwt):
+            return
+        username = client._original_username
+        while True:
+            stored = self.session_store.get(username)
+            if stored is not None and not self._expiring(stored):
+                # Another client renewed it already
+                client.jwt = stored
+                return
+            if client.password is None:
+                return
+            if self.session_store.acquire_lease(username):
+                break
+            # Another client is renewing it. The current token can be used meanwhile until it expires; after that,
+            # wait for the new token, or for the lease to lapse if the other client failed.
+            if not self._expired(client.jwt):
+                return
+            time.sleep(self.LEASE_POLL_INTERVAL)
+        try:
+            # The current token stays in use by other threads until the new one is received
+            client._login_with_password()
+        finally:
+            self.session_store.release_lease(username)
+
+    def refresh_sessions(self):
+        """
+        Renew the tokens of the accounts which expire within ``refresh_margin`` seconds.
+
+        :return: Dict of username to the exception raised while renewing its token, for the accounts which failed
+        """
+        expiring = set(self.session_store.expiring(time.time() + self.refresh_margin)) & set(self.accounts)
+        return {username: error for username, _, error in self.map(lambda client: None, expiring) if error is not None}
+
+    def map(self, func, usernames=None):
+        """
+        Call ``func(client)`` for many accounts in the worker threads.
+
+        Yields ``(username, result, error)`` tuples in completion order. An exception raised for one account is yielded
+        as its ``error`` instead of stopping the others.
+
+        :param usernames: The accounts to call ``func`` for. Defaults to every account.
+        """
+        futures = {self._executor.submit(lambda username: func(self.client(username)), username): username
+                   for username in (self.accounts if usernames is None else usernames)}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error else future.result(), error
+
+    def start_refresher(self, interval=60):
+        """Renew expiring tokens every ``interval`` seconds in a background thread, until :meth:`close` is called."""
+        def run():
+            while not self._stop_refresher.wait(interval):
+                self.refresh_sessions()
+        self._refresher = threading.Thread(target=run, daemon=True)
+        self._refresher.start()
+
+    def close(self):
+        """Stop the background refresher and the worker threads."""
+        self._stop_refresher.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncDuolingo(object):
+    """
+    Asyncio front end for :class:`Duolingo`.
+
+    requests has no non-blocking transport, so each network call of the wrapped client is run in an executor. Parsing
+    and derived data come from the same :class:`Duolingo` code, so results match the sync client exactly, and many
+    accounts can be driven concurrently from one event loop.
+
+    Methods of the wrapped client which are not overridden here are run in the executor too, and so are properties
+    other than ``jwt``, such as ``user_data``, which may download the user's data: ``await lingo.user_data``. Other
+    attributes are read straight from the wrapped client. The ``iter_*`` methods are async iterators, which pull each
+    item in the executor: ``async for user in lingo.iter_users(...)``.
+    """
+    # Properties of the client which never make a request
+    _PLAIN_PROPERTIES = frozenset(['jwt'])
+
+    def __init__(self, client, *, executor=None):
+        """
+        :param client: An authenticated :class:`Duolingo` instance.
+        :param executor: ``concurrent.futures.Executor`` to run blocking calls in. Defaults to the loop's executor,
+        which caps concurrency at its worker count, so pass a larger pool when polling many accounts.
+        """
+        self.client = client
+        self.executor = executor
+
+    @classmethod
+    async def create(cls, username, password=None, *, executor=None, **kwargs):
+        """
+        Log in and load user data without blocking the event loop.
+
+        Takes the same arguments as :class:`Duolingo`.
+        """
+        loop = asyncio.get_event_loop()
+        client = await loop.run_in_executor(executor, functools.partial(Duolingo, username, password, **kwargs))
+        return cls(client, executor=executor)
+
+    def __getattr__(self, name):
+        if isinstance(getattr(type(self.client), name, None), property) and name not in self._PLAIN_PROPERTIES:
+            return self._run(getattr, self.client, name)
+        value = getattr(self.client, name)
+        if callable(value):
+            return functools.partial(self._run, value)
+        return value
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _iterate(self, func, *args, **kwargs):
+        """Call a method returning an iterator in the executor, and pull each of its items in the executor too."""
+        items = await self._run(lambda: iter(func(*args, **kwargs)))
+        done = object()
+        try:
+            while True:
+                item = await self._run(next, items, done)
+                if item is done:
+                    return
+                yield item
+        finally:
+            if hasattr(items, "close"):
+                await self._run(items.close)
+
+    async def _login(self):
+        return await self._run(self.client._login)
+
+    async def _get_data(self):
+        return await self._run(self.client._get_data)
+
+    async def get_data_by_user_id(self, fields=None):
+        return await self._run(self.client.get_data_by_user_id, fields)
+
+    async def get_vocabulary(self, language_abbr=None):
+        return await self._run(self.client.get_vocabulary, language_abbr)
+
+    async def get_translations(self, words, source=None, target=None, max_workers=None):
+        return await self._run(self.client.get_translations, words, source, target, max_workers)
+
+    async def get_leaderboard(self, unit, before, top=None):
+        return await self._run(self.client.get_leaderboard, unit, before, top)
+
+    def iter_users(self, usernames_or_ids, fields=None, max_workers=None):
+        return self._iterate(self.client.iter_users, usernames_or_ids, fields, max_workers)
+
+    def iter_vocabulary(self, language_abbr=None):
+        return self._iterate(self.client.iter_vocabulary, language_abbr)
+
+    def iter_skills(self, language_abbr=None):
+        return self._iterate(self.client.iter_skills, language_abbr)
+
+
 attrs = [
     'settings', 'languages', 'user_info', 'streak_info',
     'calendar', 'language_progress', 'friends', 'known_words',
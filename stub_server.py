@@ -0,0 +1,338 @@
+"""
+Local stand-in for the Duolingo API, for offline benchmarks and tests.
+
+It serves generated fixtures of a configurable size, or recorded ones given as ``fixtures``, with an optional added
+latency, and ``StubServer.adapters()`` sends a client's requests for the Duolingo hosts to it::
+
+    with stub_server.StubServer(skill_count=200, latency=0.05) as server:
+        lingo = duolingo.Duolingo("stub", "password", adapters=server.adapters())
+"""
+import base64
+import json
+import random
+import re
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import duolingo
+
+
+def random_words(count, seed=0):
+    """
+    Returns a reproducible list of random words
+    :param count: int Number of words to generate
+    :param seed: Seed for the random generator
+    :return: A list of str of 1 to 12 letters, with some non-ascii characters mixed in
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + "áéíñóúü"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+
+def synthetic_user_data(language_count=3, skill_count=100, words_per_skill=10, friend_count=30, seed=0):
+    """
+    Returns a reproducible legacy user document of a realistic shape
+    :return: A dict like the one from ``https://www.duolingo.com/users/<username>``
+    """
+    rng = random.Random(seed)
+    languages = ["es", "fr", "de", "it", "pt", "ru"][:language_count]
+    language_data = {}
+    for lang in languages:
+        skills = [{
+            "id": "{:032x}".format(rng.getrandbits(128)),
+            "name": "Skill {}".format(i),
+            "title": "Skill {}".format(i),
+            "url_title": "Skill-{}".format(i),
+            "learned": rng.random() < 0.7,
+            "strength": rng.choice([0.25, 0.5, 0.75, 1.0]),
+            "words": ["word{}".format(rng.randrange(skill_count * words_per_skill)) for _ in range(words_per_skill)],
+            "dependencies_name": ["Skill {}".format(i - 1)] if i else [],
+            "dependencies": ["Skill-{}".format(i - 1)] if i else [],
+            "language_string": lang,
+            "explanation": "<p>{}</p>".format(" ".join(random_words(60, seed=i))),
+            "progress_percent": rng.randrange(100),
+            "coords_x": i % 3, "coords_y": i // 3, "icon_color": "blue", "num_lessons": 5, "missing_lessons": 0,
+            "has_explanation": True, "locked": False, "beginner": i < 5, "bonus": False, "short": "Sk{}".format(i),
+        } for i in range(skill_count)]
+        language_data[lang] = {
+            "language": lang, "language_string": lang.upper(), "streak": 10, "level": 12, "level_progress": 40,
+            "level_percent": 30, "level_points": 500, "level_left": 60, "next_level": 13, "num_skills_learned": 70,
+            "points": 9000, "points_rank": 2, "fluency_score": 0.4,
+            "calendar": [{"skill_id": skills[rng.randrange(skill_count)]["id"], "improvement": 10,
+                          "event_type": "practice", "datetime": 1600000000000 + i} for i in range(200)],
+            "skills": skills,
+            "points_ranking_data": [{
+                "id": 1000 + i, "username": "friend{}".format(i), "avatar": "https://example.com/{}".format(i),
+                "points_data": {"total": rng.randrange(10000), "languages": [
+                    {"language": lang, "language_string": lang.upper(), "points": rng.randrange(10000), "level": 5}
+                ]},
+                "self": False,
+            } for i in range(friend_count)],
+            "bonus_skills": [], "first_time": False, "max_tree_level": 1,
+        }
+    return {
+        "id": 1, "username": "benchmark", "fullname": "Benchmark", "bio": "", "avatar": "https://example.com/avatar",
+        "location": "", "created": "1 year ago", "cohort": 1, "admin": False, "learning_language": languages[0],
+        "learning_language_string": languages[0].upper(), "ui_language": "en", "daily_goal": 20, "site_streak": 10,
+        "streak_extended_today": True, "calendar": language_data[languages[0]]["calendar"],
+        "languages": [{"language": lang, "language_string": lang.upper(), "learning": True, "current_learning": False,
+                       "level": 12, "points": 9000, "streak": 10} for lang in languages],
+        "language_data": language_data,
+        "tracking_properties": {"key{}".format(i): "value{}".format(i) for i in range(100)},
+        "inventory": {}, "email_verified": True, "num_followers": 3, "num_following": 4,
+    }
+
+
+def _jwt(claims):
+    """Build an unsigned JWT with the given claims, which the client only decodes."""
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+    return "{}.{}.stub".format(encode({"alg": "none"}), encode(claims))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer each response into one write; separate header and body writes stall on delayed ACKs
+    wbufsize = 64 * 1024
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        url = urlsplit(self.path)
+        status, headers, payload = self.server.stub.respond(method, url.path, parse_qs(url.query), body,
+                                                           self.headers.get("Authorization"))
+        if self.server.stub.latency:
+            time.sleep(self.server.stub.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubAdapter(duolingo._TimedHTTPAdapter):
+    """Transport adapter sending requests for any host to a stub server instead, keeping their path and query."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        request = request.copy()
+        parts = request.url.split("/", 3)
+        request.url = "{}/{}".format(self.base_url, parts[3] if len(parts) > 3 else "")
+        return super().send(request, **kwargs)
+
+
+class StubServer(object):
+    """
+    HTTP server on localhost answering the Duolingo endpoints used by the client:
+    ``/login``, ``/users/<name>``, ``/2017-06-30/users``, ``/2017-06-30/users/<id>``, ``/2017-06-30/sessions``,
+    ``/vocabulary/overview``, ``/api/1/dictionary/hints/<from>/<to>``, ``/api/1/dictionary_page``,
+    ``/friendships/leaderboard_activity`` and ``/switch_language``.
+
+    Requests other than logging in must carry a token issued by ``/login``, unless ``require_auth`` is False.
+    """
+    ROUTES = (
+        ("POST", re.compile(r"^/login$"), "login"),
+        ("GET", re.compile(r"^/users/(?P<username>[^/]+)$"), "user"),
+        ("GET", re.compile(r"^/2017-06-30/users$"), "user_lookup"),
+        ("GET", re.compile(r"^/2017-06-30/users/(?P<user_id>\d+)$"), "user_by_id"),
+        ("POST", re.compile(r"^/2017-06-30/sessions$"), "session"),
+        ("GET", re.compile(r"^/vocabulary/overview$"), "vocabulary"),
+        ("GET", re.compile(r"^/api/1/dictionary/hints/(?P<from_language>[^/]+)/(?P<to_language>[^/]+)$"), "hints"),
+        ("GET", re.compile(r"^/api/1/dictionary_page$"), "dictionary_page"),
+        ("GET", re.compile(r"^/friendships/leaderboard_activity$"), "leaderboard"),
+        ("POST", re.compile(r"^/switch_language$"), "switch_language"),
+    )
+
+    def __init__(self, username="stub", language_count=3, skill_count=100, words_per_skill=10, friend_count=30,
+                 challenges_per_session=20, latency=0.0, require_auth=True, fixtures=None, seed=0):
+        """
+        :param username: Name of the user whose documents are served. Any name is answered with them.
+        :param language_count: Number of languages the user learns
+        :param skill_count: Number of skills per language
+        :param words_per_skill: Number of words taught by each skill
+        :param friend_count: Number of friends in the user document and the leaderboard
+        :param challenges_per_session: Number of challenges in each practice session
+        :param latency: Number of seconds added before every response
+        :param require_auth: Answer 401 to requests without a token issued by ``/login``
+        :param fixtures: Dict of route name (as in ``ROUTES``) to a recorded JSON payload served instead of the
+        generated one
+        :param seed: Seed for the generated fixtures
+        """
+        self.username = username
+        self.challenges_per_session = challenges_per_session
+        self.latency = latency
+        self.require_auth = require_auth
+        self.fixtures = dict(fixtures or {})
+        self.requests = 0
+        self.requests_by_route = {}
+        self.user_data = synthetic_user_data(language_count, skill_count, words_per_skill, friend_count, seed)
+        self.user_data["username"] = username
+        self._user_document = json.dumps(self.user_data).encode()
+        self._skills = {skill["id"]: skill for data in self.user_data["language_data"].values()
+                        for skill in data["skills"]}
+        self._vocabulary_document = None
+        self._token = _jwt({"sub": self.user_data["id"], "exp": int(time.time()) + 30 * 24 * 60 * 60})
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.base_url = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self.base_url = "http://127.0.0.1:{}".format(self._server.server_address[1])
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path):
+        return self.base_url + path
+
+    def adapters(self, **kwargs):
+        """
+        Get transport adapters sending requests for the Duolingo hosts to this server, to pass as ``adapters`` to
+        :class:`duolingo.Duolingo`. Keyword arguments are passed on to the adapter, such as ``pool_maxsize``.
+        """
+        adapter = StubAdapter(self.base_url, **kwargs)
+        return {host: adapter for host in duolingo.DUOLINGO_HOSTS}
+
+    def respond(self, method, path, query, body, authorization):
+        """
+        Answer one request
+        :return: A tuple of the status, a dict of extra headers and the encoded body
+        """
+        with self._lock:
+            self.requests += 1
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            return 404, {}, b'{}'
+        with self._lock:
+            self.requests_by_route[name] = self.requests_by_route.get(name, 0) + 1
+        if name != "login" and self.require_auth and authorization != "Bearer " + self._token:
+            return 401, {}, b'{}'
+        if name in self.fixtures:
+            return 200, {"jwt": self._token} if name == "login" else {}, json.dumps(self.fixtures[name]).encode()
+        status, headers, payload = getattr(self, "_" + name)(query=query, body=body, **match.groupdict())
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+        return status, headers, payload
+
+    def _login(self, query, body):
+        return 200, {"jwt": self._token}, {"username": body["login"], "user_id": self.user_data["id"]}
+
+    def _user(self, query, body, username):
+        return 200, {}, self._user_document
+
+    def _user_lookup(self, query, body):
+        username = query.get("username", [self.username])[0]
+        return 200, {}, {"users": [{"id": self.user_data["id"], "username": username}]}
+
+    def _user_by_id(self, query, body, user_id):
+        data = self.user_data
+        document = {
+            "id": int(user_id), "username": data["username"], "name": data["fullname"], "picture": data["avatar"],
+            "bio": data["bio"], "location": data["location"], "fromLanguage": data["ui_language"],
+            "learningLanguage": data["learning_language"], "streak": data["site_streak"], "xpGoal": data["daily_goal"],
+            "xpGains": [{"time": int(time.time()) - 60 * i, "xp": 10, "skillId": skill_id}
+                        for i, skill_id in enumerate(list(self._skills)[:5])],
+            "streakData": {"updatedTimestamp": int(time.time())},
+        }
+        fields = query.get("fields", [""])[0]
+        if fields:
+            document = {field: document[field] for field in unquote(fields).split(",") if field in document}
+        return 200, {}, document
+
+    def _session(self, query, body):
+        skill = self._skills.get(body.get("skillId"))
+        if skill is None:
+            return 404, {}, {}
+        rng = random.Random(skill["id"])
+        tts = "https://d1.cloudfront.net/{}/{{}}".format(skill["language_string"])
+        challenges = []
+        for i in range(self.challenges_per_session):
+            words = rng.sample(skill["words"], min(3, len(skill["words"])))
+            challenges.append({
+                "type": "translate",
+                "prompt": " ".join(words),
+                "tts": tts.format(rng.getrandbits(64)),
+                "tokens": [{"value": word, "tts": tts.format(word)} for word in words],
+            })
+        return 200, {}, {"challenges": challenges}
+
+    def _vocabulary_overview(self):
+        if self._vocabulary_document is None:
+            lang = self.user_data["learning_language"]
+            entries = []
+            for skill in self.user_data["language_data"][lang]["skills"]:
+                for word in skill["words"]:
+                    entries.append({
+                        "word_string": word, "normalized_string": word, "lexeme_id": "{:032x}".format(len(entries)),
+                        "skill": skill["name"], "skill_url_title": skill["url_title"], "strength_bars": 4,
+                        "strength": 0.9, "pos": "Noun", "gender": None, "infinitive": None,
+                        "last_practiced": "2020-01-01T00:00:00Z", "last_practiced_ms": 1577836800000,
+                    })
+            for i, entry in enumerate(entries):
+                entry["id"] = entry["lexeme_id"]
+                entry["related_lexemes"] = [entries[j]["lexeme_id"] for j in (i - 1, i + 1) if 0 <= j < len(entries)]
+            self._vocabulary_document = json.dumps({
+                "language_string": lang.upper(), "learning_language": lang, "from_language": "en",
+                "language_information": {}, "vocab_overview": entries,
+            }).encode()
+        return self._vocabulary_document
+
+    def _vocabulary(self, query, body):
+        return 200, {}, self._vocabulary_overview()
+
+    def _hints(self, query, body, from_language, to_language):
+        words = json.loads(unquote(query.get("tokens", ["[]"])[0]))
+        return 200, {}, {word: ["{}-{}".format(word, to_language), "{}-{}-2".format(word, to_language)]
+                         for word in words}
+
+    def _dictionary_page(self, query, body):
+        lexeme_id = query.get("lexeme_id", [""])[0]
+        return 200, {}, {"lexeme_id": lexeme_id, "translations": "translation of {}".format(lexeme_id),
+                         "alternative_forms": [], "discussions": []}
+
+    def _leaderboard(self, query, body):
+        lang = self.user_data["learning_language"]
+        friends = self.user_data["language_data"][lang]["points_ranking_data"]
+        return 200, {}, {"ranking": {str(friend["id"]): friend["points_data"]["total"] for friend in friends}}
+
+    def _switch_language(self, query, body):
+        return 200, {}, {"tracking_properties": {"learning_language": body["learning_language"]}}
+
@@ -1,9 +1,17 @@
+import ast
+import asyncio
+import base64
+import json
 import os
+import tempfile
+import threading
+import time
 import unittest
-from datetime import datetime
-from unittest.mock import patch
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
 
 import duolingo
+import stub_server
 
 USERNAME = os.environ.get('DUOLINGO_USER', 'ferguslongley')
 PASSWORD = os.environ.get('DUOLINGO_PASSWORD')
@@ -22,6 +30,65 @@ def _example_word(lang):
     }.get(lang)
 
 
+def _offline_lingo(user_data=None, **kwargs):
+    """
+    Builds a Duolingo client without touching the network
+    :param user_data: dict Legacy user document to load as user_data
+    :return: A Duolingo instance
+    """
+    if user_data is None:
+        user_data = {"id": 1, "username": USERNAME, "ui_language": "en", "language_data": {"es": {"skills": []}}}
+    with patch("duolingo.Duolingo._login"), patch("duolingo.Duolingo._get_data", return_value=user_data):
+        return duolingo.Duolingo(USERNAME, jwt="jwt-example", **kwargs)
+
+
+def _skill(name, learned=True, strength=1.0, dependencies=(), words=()):
+    """
+    Builds a skill of the legacy user document
+    :return: A skill dict
+    """
+    return {"id": "id-" + name, "name": name, "title": name.title(), "learned": learned, "strength": strength,
+            "dependencies_name": list(dependencies), "words": list(words)}
+
+
+def _language_user_data(skills):
+    """
+    Builds a legacy user document learning Spanish and French
+    :param skills: list The Spanish skills
+    :return: A user data dict
+    """
+    return {
+        "id": 1,
+        "username": USERNAME,
+        "languages": [
+            {"language": "es", "language_string": "Spanish", "learning": True},
+            {"language": "de", "language_string": "German", "learning": False},
+            {"language": "fr", "language_string": "French", "learning": True},
+        ],
+        "language_data": {"es": {"skills": skills}},
+    }
+
+
+def _jwt(claims):
+    """
+    Builds an unsigned JWT
+    :param claims: dict Payload of the token
+    :return: The token as a str
+    """
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode("utf-8")).decode("ascii").rstrip("=")
+    return "eyJhbGciOiJIUzI1NiJ9.{}.signature".format(payload)
+
+
+def _response(json_data, status_code=200):
+    """
+    Builds a fake requests response
+    :param json_data: Decoded JSON body of the response
+    :param status_code: int HTTP status of the response
+    :return: A Mock with the parts of requests.Response used by the library
+    """
+    return Mock(status_code=status_code, json=Mock(return_value=json_data), headers={})
+
+
 class DuolingoTest(unittest.TestCase):
 
     @patch("duolingo.Duolingo._get_data")
@@ -52,6 +119,714 @@ class DuolingoTest(unittest.TestCase):
         mock_data.assert_called_once_with()
 
 
+class DuolingoOfflineTest(unittest.TestCase):
+
+    def _session_response(self, url, data=None):
+        if data["skillId"] == "broken":
+            return _response({}, status_code=500)
+        return _response({"challenges": [
+            {"prompt": "Hola", "tts": "https://tts/{}/hola".format(data["skillId"])},
+            {"tokens": [[{"value": "adios", "tts": "https://tts/adios"}]]},
+        ]})
+
+    def test_populate_audio_urls_concurrently(self):
+        skills = [{"id": skill_id} for skill_id in ["a", "b", "broken", "c"]]
+        lingo = _offline_lingo({"id": 1, "language_data": {"es": {"skills": skills}}})
+        progress = []
+        with patch.object(lingo, "_make_req", side_effect=self._session_response):
+            failures = lingo.populate_audio_urls(
+                "es", max_workers=3, progress_callback=lambda *args: progress.append(args)
+            )
+        assert list(failures) == ["broken"]
+        assert isinstance(failures["broken"], duolingo.DuolingoException)
+        assert lingo.voice_url_dict["es"]["hola"] == {"https://tts/a/hola", "https://tts/b/hola", "https://tts/c/hola"}
+        assert lingo.voice_url_dict["es"]["adios"] == {"https://tts/adios"}
+        assert sorted(done for done, _, _, _ in progress) == [1, 2, 3, 4]
+        assert all(total == 4 for _, total, _, _ in progress)
+
+    def test_voice_cache_file_only_scrapes_new_skills(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_file = os.path.join(temp_dir, "voices.json")
+            skills = [{"id": "a"}, {"id": "b"}]
+            lingo = _offline_lingo({"id": 1, "language_data": {"es": {"skills": skills}}}, voice_cache_file=cache_file)
+            with patch.object(lingo, "_make_req", side_effect=self._session_response) as mock_req:
+                lingo.populate_audio_urls("es")
+            assert mock_req.call_count == 2
+
+            skills.append({"id": "c"})
+            lingo = _offline_lingo({"id": 1, "language_data": {"es": {"skills": skills}}}, voice_cache_file=cache_file)
+            with patch.object(lingo, "_make_req", side_effect=self._session_response) as mock_req:
+                lingo.populate_audio_urls("es")
+            assert [call[0][1]["skillId"] for call in mock_req.call_args_list] == ["c"]
+            assert lingo.voice_url_dict["es"]["hola"] == {"https://tts/a/hola", "https://tts/b/hola",
+                                                          "https://tts/c/hola"}
+
+            lingo = _offline_lingo({"id": 1, "language_data": {"es": {"skills": skills}}}, voice_cache_file=cache_file,
+                                   voice_cache_ttl=-1)
+            with patch.object(lingo, "_make_req", side_effect=self._session_response) as mock_req:
+                lingo.populate_audio_urls("es")
+            assert mock_req.call_count == 3
+
+    def test_get_translations_merges_concurrent_segments(self):
+        lingo = _offline_lingo()
+        words = ["word{}".format(i) for i in range(4500)]
+
+        def raw_translations(segment, source, target):
+            assert (source, target) == ("en", "es")
+            return {word: [word.upper()] for word in segment}
+
+        with patch.object(lingo, "_get_raw_translations", side_effect=raw_translations) as mock_raw:
+            result = lingo.get_translations(words, max_workers=4)
+        assert mock_raw.call_count == len(lingo._segment_translations_list(words)) > 1
+        assert result == {word: [word.upper()] for word in words}
+
+    def test_get_translations_raises_on_error_response(self):
+        lingo = _offline_lingo()
+        with patch.object(lingo, "_make_req", return_value=_response({}, status_code=503)):
+            with self.assertRaises(duolingo.DuolingoException):
+                lingo.get_translations(["hola", "adios"], max_workers=2)
+
+    def test_segment_translations_list_matches_json_lengths(self):
+        words = ["palabra{}".format(i) * (i % 5 + 1) for i in range(5000)] + ["ñandú"] * 3000
+        segments = duolingo.Duolingo._segment_translations_list(words)
+        assert [word for segment in segments for word in segment] == words
+        for segment, next_segment in zip(segments, segments[1:]):
+            assert len(segment) < 2000 and len(duolingo.json.dumps(segment)) < 12800
+            grown = segment + next_segment[:1]
+            assert len(grown) >= 2000 or len(duolingo.json.dumps(grown)) >= 12800
+
+    def test_get_translations_only_requests_cache_misses(self):
+        cache = duolingo.Cache()
+        lingo = _offline_lingo(translation_cache=cache)
+        raw_translations = lambda segment, source, target: {word: [word.upper()] for word in segment}
+        with patch.object(lingo, "_get_raw_translations", side_effect=raw_translations) as mock_raw:
+            assert lingo.get_translations(["uno", "dos"]) == {"uno": ["UNO"], "dos": ["DOS"]}
+            assert lingo.get_translations(["dos", "tres"]) == {"dos": ["DOS"], "tres": ["TRES"]}
+            assert lingo.get_translations("uno") == {"uno": ["UNO"]}
+        assert [call[0][0] for call in mock_raw.call_args_list] == [["uno", "dos"], ["tres"]]
+        assert (cache.hits, cache.misses) == (2, 3)
+
+    @patch("duolingo.Duolingo._login")
+    @patch("duolingo.Duolingo._get_data", return_value={"id": 42, "username": USERNAME, "site_streak": 3})
+    def test_projection_requests_only_needed_fields(self, mock_data, mock_login):
+        lingo = duolingo.Duolingo(USERNAME, jwt=_jwt({"sub": 42}), projection=True)
+        mock_data.assert_not_called()
+        projected = {"streak": 3, "xpGoal": 20, "xpGains": [{"time": 0, "xp": 10}],
+                     "streakData": {"updatedTimestamp": 0}}
+        with patch.object(lingo, "_make_req", return_value=_response(projected)) as mock_req:
+            assert lingo.get_streak_info() == {"daily_goal": 20, "site_streak": 3, "streak_extended_today": False}
+        mock_req.assert_called_once_with(
+            "https://www.duolingo.com/2017-06-30/users/42?fields=streak,streakData,xpGains,xpGoal"
+        )
+        mock_data.assert_not_called()
+        assert lingo.user_data.site_streak == 3
+        assert lingo.get_streak_info()["site_streak"] == 3
+        mock_data.assert_called_once_with()
+
+    def test_conditional_requests_reuse_unchanged_user_data(self):
+        lingo = _offline_lingo({"id": 1, "site_streak": 3}, conditional_requests=True)
+        first = _response({"id": 1, "site_streak": 4})
+        first.headers = {"ETag": '"v2"'}
+        with patch.object(lingo.session, "send", side_effect=[first, _response(None, status_code=304)]) as mock_send:
+            assert lingo.refresh() is True
+            with patch.object(lingo, "_make_user_data") as make_user_data:
+                assert lingo.refresh() is False
+        make_user_data.assert_not_called()
+        assert mock_send.call_args[0][0].headers["If-None-Match"] == '"v2"'
+        first.json.assert_called_once_with()
+        assert lingo.user_data.site_streak == 4
+
+    def test_conditional_responses_are_bounded(self):
+        lingo = _offline_lingo(conditional_requests=True)
+        lingo.CONDITIONAL_CACHE_SIZE = 2
+
+        def send(prepped, **kwargs):
+            if "If-None-Match" in prepped.headers:
+                return _response(None, status_code=304)
+            resp = _response({"url": prepped.url})
+            resp.headers = {"ETag": '"v1"'}
+            return resp
+
+        urls = ["https://www.duolingo.com/users/{}".format(name) for name in ("a", "b", "c")]
+        with patch.object(lingo.session, "send", side_effect=send):
+            for url in urls:
+                lingo._json(url, lingo._make_req(url))
+            lingo._make_req(urls[1])
+            lingo._make_req("https://www.duolingo.com/users/d")
+        assert list(lingo._conditional_responses) == [urls[1], "https://www.duolingo.com/users/d"]
+        assert list(lingo._conditional_payloads) == [urls[1]]
+
+    def test_adapters_are_shared_between_clients(self):
+        adapters = duolingo.make_adapters(pool_maxsize=4,
+                                          host_options={"https://d2.duolingo.com": {"pool_maxsize": 16}})
+        lingo1 = _offline_lingo(adapters=adapters)
+        lingo2 = _offline_lingo(adapters=adapters, keep_alive=False)
+        for host in duolingo.DUOLINGO_HOSTS:
+            assert lingo1.session.get_adapter(host + "/") is lingo2.session.get_adapter(host + "/") is adapters[host]
+        assert adapters["https://www.duolingo.com"]._pool_maxsize == 4
+        assert adapters["https://d2.duolingo.com"]._pool_maxsize == 16
+        assert lingo1.session is not lingo2.session
+        with patch.object(lingo2.session, "send", return_value=_response({})) as mock_send:
+            lingo2._make_req("https://www.duolingo.com/vocabulary/overview")
+        assert mock_send.call_args[0][0].headers["Connection"] == "close"
+
+    def test_make_req_uses_session_headers(self):
+        lingo = _offline_lingo()
+        lingo.session.cookies.set("csrf", "token")
+        with patch.object(lingo.session, "send", return_value=_response({})) as mock_send:
+            lingo._make_req("https://www.duolingo.com/vocabulary/overview")
+            lingo.jwt = None
+            lingo._make_req("https://www.duolingo.com/switch_language", {"learning_language": "es"})
+        first, second = [call[0][0] for call in mock_send.call_args_list]
+        assert first.method == "GET"
+        assert first.headers["Authorization"] == "Bearer jwt-example"
+        assert first.headers["User-Agent"] == duolingo.Duolingo.USER_AGENT
+        assert first.headers["Cookie"] == "csrf=token"
+        assert second.method == "POST"
+        assert "Authorization" not in second.headers
+
+    def test_get_users_fetches_concurrently_without_switching_user(self):
+        lingo = _offline_lingo()
+        user_data = lingo.user_data
+
+        def make_req(url):
+            if url == "https://www.duolingo.com/2017-06-30/users?username=friend":
+                return _response({"users": [{"id": 7}]})
+            if url == "https://www.duolingo.com/2017-06-30/users?username=nobody":
+                return _response({"users": []})
+            if url.startswith("https://www.duolingo.com/2017-06-30/users/404?"):
+                return _response({}, status_code=404)
+            user_id = int(url.split("/")[-1].split("?")[0])
+            assert url.endswith("?fields=id,streak,courses")
+            return _response({"id": user_id, "streak": user_id * 2, "courses": [{"id": "es"}]})
+
+        with patch.object(lingo, "_make_req", side_effect=make_req):
+            users = lingo.get_users(["friend", 3, "nobody", 404], fields=["id", "streak", "courses"], max_workers=4)
+        assert users["friend"]["streak"] == 14
+        assert users[3] == {"id": 3, "streak": 6, "courses": ({"id": "es"},)}
+        assert users["nobody"] is None and users[404] is None
+        with self.assertRaises(TypeError):
+            users[3]["streak"] = 0
+        assert lingo.user_data is user_data
+        assert lingo.username == USERNAME
+
+        with patch.object(lingo, "_make_req", side_effect=duolingo.CaptchaException("captcha")):
+            with self.assertRaises(duolingo.CaptchaException):
+                lingo.get_users(["stranger"])
+        with patch.object(lingo, "_make_req", return_value=_response({"error": "boom"}, status_code=500)):
+            with self.assertRaises(duolingo.DuolingoException):
+                lingo.get_users([5])
+            with self.assertRaises(duolingo.DuolingoException):
+                lingo.get_users(["stranger"])
+
+    def test_get_leaderboard_joins_ranking_by_id(self):
+        friends = [{"username": "user{}".format(i), "id": i, "points_data": {"total": 0, "languages": []}}
+                   for i in range(50)]
+        lingo = _offline_lingo({"id": 1, "language_data": {"es": {"points_ranking_data": friends}}})
+        ranking = {str(i): str(i * 7 % 50) for i in range(0, 60, 2)}
+        with patch.object(lingo, "_make_req", return_value=_response({"ranking": ranking})):
+            leaderboard = lingo.get_leaderboard("week", "2020.01.01 00:00:00")
+            top = lingo.get_leaderboard("week", "2020.01.01 00:00:00", top=3)
+        assert len(leaderboard) == 25
+        assert [user["points"] for user in leaderboard] == sorted((i * 7 % 50 for i in range(0, 50, 2)), reverse=True)
+        assert leaderboard[0] == {"points": 48, "unit": "week", "id": 14, "username": "user14"}
+        assert top == leaderboard[:3]
+
+    def test_derived_views_are_cached_until_user_data_reloads(self):
+        skills = [_skill("basics", words=["hola", "adios"]), _skill("food", strength=0.5, words=["pan", "hola"]),
+                  _skill("travel", learned=False, words=["tren"])]
+        lingo = _offline_lingo(_language_user_data(skills))
+        assert lingo.get_languages() == ["Spanish", "French"]
+        assert lingo.get_languages(abbreviations=True) == ["es", "fr"]
+        assert lingo.get_language_from_abbr("de") == "German"
+        assert lingo.get_abbreviation_of("FRENCH") == "fr"
+        assert lingo.get_abbreviation_of("Italian") is None
+        assert lingo.get_language_details("Spanish")["language"] == "es"
+        assert lingo.get_language_details("Italian") == {}
+        assert sorted(lingo.get_known_words("es")) == ["adios", "hola", "pan"]
+        assert lingo.get_known_topics("es") == ["Basics", "Food"]
+        assert lingo.get_unknown_topics("es") == ["Travel"]
+        assert lingo.get_golden_topics("es") == ["Basics"]
+        assert lingo.get_reviewable_topics("es") == ["Food"]
+
+        skills[2]["learned"] = True
+        lingo.get_known_topics("es").append("Changed by caller")
+        assert lingo.get_known_topics("es") == ["Basics", "Food"]
+        with patch.object(lingo, "_get_data", return_value=_language_user_data(skills)):
+            lingo.set_username(USERNAME)
+        assert lingo.get_known_topics("es") == ["Basics", "Food", "Travel"]
+
+        lingo = _offline_lingo(_language_user_data(skills), projection=True)
+        with patch.object(lingo, "_get_data", return_value=_language_user_data(skills)) as mock_data:
+            assert lingo.get_languages() == ["Spanish", "French"]
+        assert list(lingo._views) == ["languages"]
+        mock_data.assert_called_once_with()
+
+        with stub_server.StubServer(skill_count=3, language_count=1) as server:
+            jwt = duolingo.Duolingo("stub", "password", adapters=server.adapters()).jwt
+            lingo = duolingo.Duolingo("stub", jwt=jwt, projection=True, adapters=server.adapters())
+            word = next(lingo.iter_vocabulary())["normalized_string"]
+            server.requests_by_route.clear()
+            assert lingo.get_related_words(word)
+            lingo.get_related_words(word)
+            assert server.requests_by_route == {"vocabulary": 1}
+
+    def test_get_learned_skills_orders_by_dependencies_without_mutating(self):
+        skills = [_skill("food", dependencies=["phrases", "basics"]), _skill("travel", learned=False),
+                  _skill("phrases", dependencies=["basics"]), _skill("basics"),
+                  _skill("animals", dependencies=["basics"])]
+        lingo = _offline_lingo(_language_user_data(skills))
+        learned = lingo.get_learned_skills("es")
+        assert [skill["name"] for skill in learned] == ["basics", "phrases", "animals", "food"]
+        assert [skill["dependency_order"] for skill in learned] == [1, 2, 2, 3]
+        assert all("dependency_order" not in skill for skill in skills)
+        assert lingo.get_learned_skills("es") == learned
+
+    def test_get_learned_skills_reports_loops(self):
+        skills = [_skill("basics"), _skill("a", dependencies=["basics", "c"]), _skill("b", dependencies=["a"]),
+                  _skill("c", dependencies=["b"]), _skill("d", dependencies=["c"])]
+        lingo = _offline_lingo(_language_user_data(skills))
+        with self.assertRaises(duolingo.DuolingoException) as context:
+            lingo.get_learned_skills("es")
+        loop = ast.literal_eval(str(context.exception).split(": ", 1)[1])
+        assert loop[0] == loop[-1]
+        assert sorted(loop[:-1]) == ["a", "b", "c"]
+
+    def test_compact_user_data_matches_struct(self):
+        data = _language_user_data([_skill("basics", words=["hola"]), _skill("food", dependencies=["basics"])])
+        data.update({"learning_language": "es", "ui_language": "en", "site_streak": 4, "daily_goal": 20,
+                     "streak_extended_today": True, "calendar": [], "tracking_properties": {"unused": True}})
+        data["language_data"]["es"].update({
+            "language": "es", "language_string": "Spanish", "level": 3, "points": 120, "streak": 4,
+            "level_progress": 20, "num_skills_learned": 2, "level_percent": 40, "level_points": 50, "points_rank": 1,
+            "next_level": 4, "level_left": 30, "fluency_score": 0.1,
+            "calendar": [{"skill_id": "id-basics", "datetime": 1}],
+            "points_ranking_data": [{"username": "friend", "id": 7, "points_data": {
+                "total": 300, "languages": [{"language": "es", "language_string": "Spanish", "points": 300}]
+            }}],
+        })
+        lingo = _offline_lingo(data)
+        compact = _offline_lingo(json.loads(json.dumps(data)), compact=True)
+        assert isinstance(compact.user_data, duolingo.User)
+        assert not hasattr(compact.user_data, "tracking_properties")
+        for getter in ["get_settings", "get_languages", "get_user_info", "get_streak_info", "get_friends"]:
+            expected = getattr(lingo, getter)()
+            actual = getattr(compact, getter)()
+            assert json.dumps(actual, default=dict, sort_keys=True) == json.dumps(expected, default=dict,
+                                                                                  sort_keys=True)
+        assert compact.get_language_progress("es") == lingo.get_language_progress("es")
+        assert compact.get_calendar("es")[0]["skill_id"] == "id-basics"
+        assert compact.get_known_words("es") == ["hola"]
+        assert [skill["name"] for skill in compact.get_learned_skills("es")] == ["basics", "food"]
+        assert compact.get_abbreviation_of("spanish") == "es"
+        assert compact.user_data.language_data["es"]["language"] is lingo.user_data.language_data["es"]["language"]
+        with patch.object(compact, "_get_data", return_value=json.loads(json.dumps(data))):
+            assert compact.refresh() is False
+
+    def test_json_array_stream_yields_items_at_path(self):
+        document = {
+            "decoy": {"vocab_overview": [{"word_string": "wrong"}]},
+            "notes": ["vocab_overview", "escaped \\\" [ { quote", -1.5e3, None],
+            "vocab_overview": [{"word_string": "caf\u00e9", "related_lexemes": ["a"]}, 12345, "ni\u00f1o", [1, []]],
+            "language_data": {"es": {"skills": [{"name": "basics"}]}, "fr": {"skills": [{"name": "bonjour"}]}},
+        }
+        body = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        for size in [1, 3, 7, len(body)]:
+            chunks = [body[i:i + size] for i in range(0, len(body), size)]
+            assert list(duolingo._JSONArrayStream(chunks, ("vocab_overview",))) == document["vocab_overview"]
+            skills = duolingo._JSONArrayStream(chunks, ("language_data", None, "skills"))
+            assert [skill["name"] for skill in skills] == ["basics", "bonjour"]
+        numbers = [bytes([byte]) for byte in b'{"points": [1.5, 2, -3e2, 10]}']
+        assert list(duolingo._JSONArrayStream(numbers, ("points",))) == [1.5, 2, -300.0, 10]
+        with self.assertRaises(ValueError):
+            list(duolingo._JSONArrayStream([b'{"vocab_overview": [{"a": 1}, {"b"'], ("vocab_overview",)))
+
+    def test_iter_vocabulary_streams_response(self):
+        lingo = _offline_lingo()
+        vocab = [{"word_string": "word{}".format(i)} for i in range(100)]
+        body = json.dumps({"language_string": "Spanish", "vocab_overview": vocab}).encode("utf-8")
+        resp = _response(None)
+        resp.iter_content = Mock(return_value=iter([body[i:i + 64] for i in range(0, len(body), 64)]))
+        with patch.object(lingo, "_make_req", return_value=resp) as make_req:
+            assert list(lingo.iter_vocabulary()) == vocab
+        make_req.assert_called_once_with("https://www.duolingo.com/vocabulary/overview", stream=True)
+        resp.close.assert_called_once_with()
+
+    def test_get_related_words_uses_vocabulary_index(self):
+        def entry(word, lexeme_id, related):
+            return {"normalized_string": word, "lexeme_id": lexeme_id, "related_lexemes": related}
+        vocab = [entry("aller", "l1", ["l3", "l1", "l3"]), entry("pain", "l2", []), entry("vais", "l3", ["l1"]),
+                 entry("allons", "l1", ["l3"])]
+        lingo = _offline_lingo()
+        with patch.object(lingo, "get_vocabulary", return_value={"vocab_overview": vocab}) as get_vocabulary:
+            assert lingo.get_related_words("Aller") == [vocab[0], vocab[2], vocab[3]]
+            assert lingo.get_related_words_batch(["vais", "pain", "manger"]) == {
+                "vais": [vocab[0], vocab[3]], "pain": [], "manger": None,
+            }
+        get_vocabulary.assert_called_once_with()
+
+    def test_get_word_definitions_reports_errors_and_caches(self):
+        cache = duolingo.Cache()
+        lingo = _offline_lingo(definition_cache=cache, max_workers=4)
+        responses = {"a": _response({"word": "a"}), "b": _response({}, status_code=404),
+                     "c": Mock(status_code=200, json=Mock(side_effect=ValueError))}
+        with patch.object(lingo, "_make_req", side_effect=lambda url: responses[url.rsplit("=", 1)[1]]) as make_req:
+            definitions, errors = lingo.get_word_definitions(["a", "b", "c", "a"])
+            assert definitions == {"a": {"word": "a"}}
+            assert sorted(errors) == ["b", "c"]
+            assert all(isinstance(error, duolingo.DuolingoException) for error in errors.values())
+            assert make_req.call_count == 3
+            assert lingo.get_word_definitions(["a"]) == ({"a": {"word": "a"}}, {})
+            assert make_req.call_count == 3
+        assert cache.hits == 1
+
+    def test_rate_limiter_spaces_requests(self):
+        limiter = duolingo.RateLimiter(rate=10, burst=2)
+        with patch.object(duolingo.time, "monotonic", return_value=limiter._updated), \
+                patch.object(duolingo.time, "sleep") as sleep:
+            for _ in range(4):
+                limiter.acquire()
+        assert [call[0][0] for call in sleep.call_args_list] == [0.1, 0.2]
+
+    def test_make_req_backs_off_and_retries(self):
+        limiter = duolingo.RateLimiter(rate=100)
+        lingo = _offline_lingo(backoff=duolingo.Backoff(retries=2), rate_limiter=limiter)
+        unavailable = _response({}, status_code=503)
+        unavailable.headers["Retry-After"] = "2"
+        with patch.object(lingo.session, "send", side_effect=[unavailable, _response({"ok": True})]) as mock_send, \
+                patch.object(duolingo.time, "sleep") as sleep:
+            assert lingo._make_req("https://www.duolingo.com/users/x").json() == {"ok": True}
+        assert mock_send.call_count == 2
+        unavailable.close.assert_called_once_with()
+        assert 50 <= limiter._current_rate < 51
+        assert 2 <= sleep.call_args[0][0] < 2.1
+
+        blocked = _response({"blockScript": "..."}, status_code=403)
+        with patch.object(lingo.session, "send", return_value=blocked) as mock_send, \
+                patch.object(duolingo.time, "sleep"):
+            with self.assertRaises(duolingo.CaptchaException):
+                lingo._make_req("https://www.duolingo.com/users/x")
+        assert mock_send.call_count == 1
+        assert limiter._current_rate < 50
+
+        with patch.object(lingo.session, "send", return_value=unavailable) as mock_send, \
+                patch.object(duolingo.time, "sleep"):
+            assert lingo._make_req("https://www.duolingo.com/2017-06-30/users/1/shop-items",
+                                   {"itemName": "streak_freeze"}).status_code == 503
+        assert mock_send.call_count == 1
+        assert duolingo.Backoff(methods=("get", "post")).retries_request("POST", 503, 0)
+
+    def test_rate_limiter_is_shared_through_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "limiter.sqlite")
+            first = duolingo.RateLimiter(rate=1, path=path)
+            second = duolingo.RateLimiter(rate=1, path=path)
+            with patch.object(duolingo.time, "time", return_value=1000.0), \
+                    patch.object(duolingo.time, "sleep") as sleep:
+                first.acquire()
+                second.acquire()
+                first.throttle(delay=5)
+                second.acquire()
+            first.close()
+            second.close()
+        assert [call[0][0] for call in sleep.call_args_list] == [1.0, 9.0]
+
+    def test_hooks_receive_request_events(self):
+        collector = duolingo.HistogramCollector()
+        exporter = duolingo.OTLPExporter(batch_size=2)
+        lingo = _offline_lingo(hooks=[collector, exporter])
+        assert isinstance(lingo.session.get_adapter("https://d2.duolingo.com/x"), duolingo._TimedHTTPAdapter)
+        resp = _response(None)
+        resp.content = b'{"hello": ["world"]}'
+        resp.elapsed = timedelta(milliseconds=20)
+        url = "https://d2.duolingo.com/api/1/dictionary/hints/es/en?tokens=%5B%22hola%22%5D"
+        with patch.object(lingo.session, "send", return_value=resp), \
+                patch.object(exporter._session, "post") as post:
+            assert lingo._make_req(url).json() == {"hello": ["world"]}
+            lingo._make_req(url)
+            exporter.flush()
+        endpoint = "https://d2.duolingo.com/api/1/dictionary/hints/{source}/{target}"
+        assert collector.statuses == {(endpoint, 200): 2}
+        assert collector.response_bytes == {endpoint: 40}
+        assert sorted(phase for key, phase in collector.histograms if key == endpoint) == [
+            "connect", "decode", "download", "tls", "total", "wait"
+        ]
+        assert collector.summary()[(endpoint, "wait")]["count"] == 2
+        spans = post.call_args[1]["json"]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [span["name"] for span in spans] == ["GET " + endpoint] * 2
+
+        with patch.object(lingo.session, "send", return_value=resp), \
+                patch.object(exporter._session, "post", side_effect=duolingo.requests.ConnectionError):
+            lingo._make_req(url)
+            exporter.close()
+        assert exporter.dropped == 1 and exporter._worker is None
+        assert {"key": "http.response.status_code", "value": {"intValue": "200"}} in spans[0]["attributes"]
+
+    def test_histogram_quantiles_and_endpoint_templates(self):
+        collector = duolingo.HistogramCollector(buckets=[1, 2, 4])
+        for seconds in [0.5, 1.5, 1.5, 3]:
+            collector.on_request(duolingo.RequestEvent("GET", "url", "endpoint", timings={"total": seconds}))
+        assert collector.quantile("endpoint", "total", 0.5) == 1.5
+        assert collector.quantile("endpoint", "total", 1) == 3
+        assert collector.quantile("endpoint", "wait", 0.5) is None
+        assert duolingo._endpoint_template("https://www.duolingo.com/users/kartik?x=1") == \
+            "https://www.duolingo.com/users/{user}"
+        assert duolingo._endpoint_template("https://www.duolingo.com/2017-06-30/users/123/shop-items") == \
+            "https://www.duolingo.com/2017-06-30/users/{user}/shop-items"
+
+    def test_stub_server_end_to_end(self):
+        with stub_server.StubServer(skill_count=5, friend_count=3, language_count=1) as server:
+            lingo = duolingo.Duolingo("stub", "password", adapters=server.adapters())
+            assert lingo.jwt and lingo.user_data.username == "stub"
+            assert lingo.get_translations(["hola"], "en", "es") == {"hola": ["hola-es", "hola-es-2"]}
+            word = lingo.user_data.language_data["es"]["skills"][0]["words"][0]
+            assert lingo.get_audio_url(word).startswith("https://d1.cloudfront.net/")
+            assert len(lingo.get_leaderboard("week", "2020-01-01")) == 3
+            assert len(list(lingo.iter_vocabulary())) == 50
+            with self.assertRaises(duolingo.DuolingoException):
+                duolingo.Duolingo("stub", jwt="expired", lazy=True, adapters=server.adapters()).get_data_by_user_id()
+
+    def test_lazy_login_runs_once_for_concurrent_requests(self):
+        with stub_server.StubServer(skill_count=3, language_count=1, latency=0.05) as server:
+            lingo = duolingo.Duolingo("stub", "password", lazy=True, adapters=server.adapters())
+            with duolingo.ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda word: lingo.get_translations([word], "en", "es"),
+                                            ["hola", "adios", "gato", "perro"]))
+            assert [list(result) for result in results] == [["hola"], ["adios"], ["gato"], ["perro"]]
+            assert server.requests_by_route["login"] == 1
+
+    def test_cassette_records_and_replays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.cassette")
+            with stub_server.StubServer(skill_count=5, language_count=1) as server, \
+                    duolingo.Cassette(path, "record") as cassette:
+                lingo = duolingo.Duolingo("stub", "password", adapters=server.adapters(), cassette=cassette)
+                vocabulary = lingo.get_vocabulary()
+                translations = lingo.get_translations(["hola"], "en", "es")
+                requests_made = server.requests
+            with open(path, "ab") as f:
+                f.write(b"partial record")
+            with duolingo.Cassette(path) as cassette:
+                assert len(cassette) == requests_made
+                lingo = duolingo.Duolingo("stub", "password", cassette=cassette)
+                assert lingo.get_vocabulary() == vocabulary
+                assert lingo.get_translations(["hola"], "en", "es") == translations
+                assert len(list(lingo.iter_vocabulary())) == len(vocabulary["vocab_overview"])
+                with self.assertRaises(duolingo.DuolingoException):
+                    lingo.get_translations(["adios"], "en", "es")
+            with duolingo.Cassette(path, "fill") as cassette:
+                key = cassette.key("GET", "https://example.com/")
+                cassette.record(key, {"status": 200, "reason": "OK", "headers": {}}, b"first")
+                cassette.record(key, {"status": 200, "reason": "OK", "headers": {}}, b"second")
+            with duolingo.Cassette(path) as cassette:
+                assert [cassette.find(key)[1] for _ in range(3)] == [b"first", b"second", b"second"]
+                assert len(cassette) == requests_made + 2
+
+    def test_pool_shares_session_store_and_refreshes_expiring_tokens(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                stub_server.StubServer(skill_count=3, language_count=1) as server:
+            path = os.path.join(directory, "sessions.sqlite")
+            accounts = {"stub": "password", "other": "password"}
+            with duolingo.DuolingoPool(accounts, duolingo.SessionStore(path), adapters=server.adapters()) as pool:
+                results = {username: result
+                           for username, result, error in pool.map(lambda client: client.get_user_info()["username"])}
+                assert results == {"stub": "stub", "other": "stub"}
+            assert server.requests_by_route["login"] == 2
+
+            store = duolingo.SessionStore(path)
+            assert store.get("stub") == pool.client("stub").jwt
+            assert store.acquire_lease("stub") and not duolingo.SessionStore(path).acquire_lease("stub")
+            store.release_lease("stub")
+            # Tokens from the stub server expire in 30 days, so a 31 day margin renews them before use
+            with duolingo.DuolingoPool(accounts, store, adapters=server.adapters(),
+                                       refresh_margin=31 * 24 * 60 * 60) as pool:
+                assert sorted(store.expiring(time.time() + pool.refresh_margin)) == ["other", "stub"]
+                assert pool.refresh_sessions() == {}
+            assert server.requests_by_route["login"] == 4
+
+    def test_password_login_keeps_current_token_until_renewed(self):
+        lingo = _offline_lingo()
+        lingo.password = "password"
+        sent = []
+
+        def send(prepped, **kwargs):
+            sent.append((prepped.headers.get("Authorization"), lingo.jwt))
+            resp = _response({"response": "OK"})
+            resp.headers["jwt"] = "jwt-renewed"
+            return resp
+
+        with patch.object(lingo.session, "send", side_effect=send):
+            assert lingo._login_with_password()
+        assert sent == [(None, "jwt-example")]
+        assert lingo.jwt == "jwt-renewed"
+        assert lingo.session.headers["Authorization"] == "Bearer jwt-renewed"
+
+    def test_pool_waits_for_expired_token_renewed_elsewhere(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                stub_server.StubServer(skill_count=3, language_count=1) as server:
+            path = os.path.join(directory, "sessions.sqlite")
+            store = duolingo.SessionStore(path)
+            store.set("stub", _jwt({"sub": 1, "exp": int(time.time()) - 10}))
+            other = duolingo.SessionStore(path)
+            renewed = _jwt({"sub": 1, "exp": int(time.time()) + 3600})
+            with duolingo.DuolingoPool({"stub": "password"}, store, adapters=server.adapters(),
+                                       refresh_margin=60) as pool:
+                pool.LEASE_POLL_INTERVAL = 0.01
+                assert other.acquire_lease("stub")
+                timer = threading.Timer(0.1, other.set, ("stub", renewed))
+                timer.start()
+                assert pool.client("stub").jwt == renewed
+                timer.join()
+                assert "login" not in server.requests_by_route
+
+                # A lease left behind by a client which failed lapses, and the token is then renewed here
+                store.set("stub", _jwt({"sub": 1, "exp": int(time.time()) - 10}))
+                pool.client("stub").jwt = store.get("stub")
+                assert other.acquire_lease("stub", duration=0.1)
+                assert not pool._expiring(pool.client("stub").jwt)
+                assert server.requests_by_route["login"] == 1
+            other.close()
+
+    def test_login_validates_jwt_locally_and_reuses_check(self):
+        with stub_server.StubServer(skill_count=3, language_count=1) as server:
+            jwt = duolingo.Duolingo("stub", "password", adapters=server.adapters()).jwt
+            assert server.requests_by_route == {"login": 1, "user": 1}
+
+            lingo = duolingo.Duolingo("stub", jwt=jwt, adapters=server.adapters())
+            assert lingo.user_data.username == "stub"
+            assert server.requests_by_route == {"login": 1, "user": 2}
+
+            expired = _jwt({"sub": 1, "exp": int(time.time()) - 10})
+            duolingo.Duolingo("stub", "password", jwt=expired, adapters=server.adapters())
+            assert server.requests_by_route == {"login": 2, "user": 3}
+
+        with stub_server.StubServer(skill_count=3, language_count=1, require_auth=False) as server:
+            lingo = duolingo.Duolingo("stub", jwt="opaque-token", adapters=server.adapters())
+            assert lingo.jwt == "opaque-token" and lingo.user_data.username == "stub"
+            assert server.requests_by_route == {"user": 1}
+            lingo.get_user_info()
+            lingo.refresh()
+            assert server.requests_by_route == {"user": 2}
+
+            lingo = duolingo.Duolingo("stub", jwt="opaque-token", projection=True, adapters=server.adapters())
+            assert server.requests_by_route == {"user": 3}
+            assert lingo.get_streak_info()["site_streak"] == lingo.user_data.site_streak
+            assert server.requests_by_route == {"user": 3}
+            lingo.refresh()
+            assert server.requests_by_route == {"user": 4}
+
+    @patch("duolingo.Duolingo._login")
+    @patch("duolingo.Duolingo._get_data", return_value={"id": 1, "username": USERNAME})
+    def test_lazy_password_defers_login_to_first_request(self, mock_data, mock_login):
+        lingo = duolingo.Duolingo(USERNAME, "password", lazy=True)
+        mock_login.assert_not_called()
+        mock_data.assert_not_called()
+        with patch.object(lingo.session, "send", return_value=_response({})):
+            lingo._make_req("https://www.duolingo.com/vocabulary/overview")
+            lingo._make_req("https://www.duolingo.com/vocabulary/overview")
+        mock_login.assert_called_once_with()
+        assert lingo.user_data.id == 1
+        mock_data.assert_called_once_with()
+
+    @patch("duolingo.Duolingo._login")
+    @patch("duolingo.Duolingo._get_data")
+    def test_lazy_jwt_is_trusted(self, mock_data, mock_login):
+        lingo = duolingo.Duolingo(USERNAME, jwt="jwt-example", lazy=True)
+        with patch.object(lingo.session, "send", return_value=_response({})):
+            lingo._make_req("https://www.duolingo.com/vocabulary/overview")
+        mock_login.assert_not_called()
+        mock_data.assert_not_called()
+
+
+class CacheTest(unittest.TestCase):
+
+    def _check_lru_and_ttl(self, backend):
+        cache = duolingo.Cache(backend, max_size=2)
+        cache.set_many({("a",): 1, ("b",): [2]})
+        assert cache.get_many([("a",)]) == {("a",): 1}
+        cache.set_many({("c",): {"three": 3}})
+        assert cache.get_many([("a",), ("b",), ("c",)]) == {("a",): 1, ("c",): {"three": 3}}
+        assert (cache.hits, cache.misses) == (3, 1)
+        cache.ttl = -1
+        assert cache.get_many([("a",)]) == {}
+        cache.ttl = None
+        assert cache.get_many([("a",)]) == {}
+
+    def test_memory_backend(self):
+        self._check_lru_and_ttl(duolingo.MemoryCacheBackend())
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "cache.sqlite")
+            backend = duolingo.SQLiteCacheBackend(path)
+            self._check_lru_and_ttl(backend)
+            backend.close()
+            backend = duolingo.SQLiteCacheBackend(path)
+            assert duolingo.Cache(backend).get_many([("c",)]) == {("c",): {"three": 3}}
+            backend.close()
+
+
+class AsyncDuolingoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    @patch("duolingo.Duolingo._login")
+    @patch("duolingo.Duolingo._get_data", return_value={"id": 1, "username": USERNAME})
+    def test_create_wraps_sync_client(self, mock_data, mock_login):
+        lingo = self.loop.run_until_complete(duolingo.AsyncDuolingo.create(USERNAME, jwt="jwt-example"))
+        assert isinstance(lingo.client, duolingo.Duolingo)
+        assert self.loop.run_until_complete(lingo.user_data).id == 1
+        assert lingo.jwt == "jwt-example" and lingo.username == USERNAME
+        mock_login.assert_called_once_with()
+
+    @patch("duolingo.Duolingo._login")
+    @patch("duolingo.Duolingo._get_data", return_value={"id": 1, "username": USERNAME})
+    def test_client_methods_and_properties_run_in_executor(self, mock_data, mock_login):
+        lingo = duolingo.AsyncDuolingo(duolingo.Duolingo(USERNAME, jwt="jwt-example", lazy=True))
+        threads = []
+        with patch.object(lingo.client, "get_user_info", side_effect=lambda: threads.append(threading.get_ident())):
+            self.loop.run_until_complete(lingo.get_user_info())
+        assert threads and threads[0] != threading.get_ident()
+        mock_data.side_effect = lambda: threads.append(threading.get_ident()) or {"id": 1}
+        assert self.loop.run_until_complete(lingo.user_data).id == 1
+        assert threads[1] != threading.get_ident()
+
+    def test_iter_methods_pull_items_in_executor(self):
+        lingo = duolingo.AsyncDuolingo(_offline_lingo())
+        threads = []
+
+        def iter_users(usernames_or_ids, fields, max_workers):
+            for user in usernames_or_ids:
+                threads.append(threading.get_ident())
+                yield user, {"id": user}
+
+        async def collect():
+            return [item async for item in lingo.iter_users([1, 2])]
+
+        with patch.object(lingo.client, "iter_users", side_effect=iter_users):
+            assert self.loop.run_until_complete(collect()) == [(1, {"id": 1}), (2, {"id": 2})]
+        assert len(threads) == 2 and threading.get_ident() not in threads
+
+    @patch("duolingo.Duolingo._login")
+    @patch("duolingo.Duolingo._get_data", return_value={"id": 1, "username": USERNAME})
+    @patch("duolingo.Duolingo.get_translations", return_value={"e": ["and"]})
+    def test_methods_are_awaitable_and_concurrent(self, mock_translations, mock_data, mock_login):
+        async def run():
+            clients = await asyncio.gather(
+                *[duolingo.AsyncDuolingo.create(USERNAME, jwt="jwt-example") for _ in range(3)]
+            )
+            return await asyncio.gather(*[client.get_translations("e") for client in clients])
+
+        results = self.loop.run_until_complete(run())
+        assert results == [{"e": ["and"]}] * 3
+        mock_translations.assert_called_with("e", None, None, None)
+        assert mock_translations.call_count == 3
+
+
 class DuolingoLoginTest(unittest.TestCase):
     lingo = None
 